@@ -2,9 +2,11 @@ import os
 import json
 import logging
 import atexit
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 from src.messenger_api import handle_message, setup_persistent_menu
-from src.utils.logger import get_logger
+from src.utils.logger import get_logger, lazy_json
+from src.utils import json_utils
 from src.youtube_api import stop_download_thread
 from src.dalle_api import stop_image_thread
 
@@ -17,6 +19,23 @@ app = Flask(__name__)
 # Vérifier si l'application est en mode de développement
 DEBUG = os.environ.get('FLASK_ENV') == 'development'
 
+# Workers de traitement des messages : le webhook répond immédiatement à Facebook et le traitement
+# (génération, téléchargement, envois) se fait en arrière-plan. Un worker mono-thread par groupe
+# d'utilisateurs conserve l'ordre des messages d'un même utilisateur.
+MESSAGE_WORKERS = int(os.environ.get('MESSAGE_WORKERS', 8))
+message_executors = [ThreadPoolExecutor(max_workers=1) for _ in range(MESSAGE_WORKERS)]
+
+def dispatch_message(sender_id, message_data):
+    """
+    Planifie le traitement d'un message sur le worker associé à l'utilisateur
+    
+    Args:
+        sender_id: ID de l'utilisateur
+        message_data: Données du message
+    """
+    executor = message_executors[hash(sender_id) % MESSAGE_WORKERS]
+    executor.submit(handle_message, sender_id, message_data)
+
 # Variable pour suivre si l'initialisation a été effectuée
 app_initialized = False
 
@@ -37,6 +56,8 @@ init_app()
 @atexit.register
 def cleanup():
     logger.info("Nettoyage avant l'arrêt de l'application")
+    for executor in message_executors:
+        executor.shutdown(wait=False)
     stop_download_thread()
     stop_image_thread()
 
@@ -62,8 +83,8 @@ def process_webhook():
     elif request.method == 'POST':
         # Traitement des messages entrants
         try:
-            data = request.json
-            logger.info(f"Webhook reçu: {json.dumps(data)}")
+            data = json_utils.loads(request.get_data())
+            logger.info("Webhook reçu: %s", lazy_json(data))
             
             if data.get('object') == 'page':
                 for entry in data.get('entry', []):
@@ -72,9 +93,9 @@ def process_webhook():
                         
                         if sender_id:
                             if 'message' in messaging_event:
-                                handle_message(sender_id, messaging_event.get('message', {}))
+                                dispatch_message(sender_id, messaging_event.get('message', {}))
                             elif 'postback' in messaging_event:
-                                handle_message(sender_id, {'postback': messaging_event.get('postback', {})})
+                                dispatch_message(sender_id, {'postback': messaging_event.get('postback', {})})
             
             return 'OK'
         except Exception as e:
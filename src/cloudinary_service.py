@@ -2,9 +2,13 @@ import os
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.exceptions
 import mimetypes
-import traceback
+import hashlib
+import threading
+from collections import OrderedDict
 from src.utils.logger import get_logger
+from src.utils.retry import retry_with_backoff
 
 logger = get_logger(__name__)
 
@@ -15,6 +19,61 @@ cloudinary.config(
     api_secret=os.environ.get("CLOUDINARY_API_SECRET")
 )
 
+# Erreurs Cloudinary définitives (requête invalide, droits, ressource) qui ne doivent pas être réessayées
+NON_RETRYABLE_ERRORS = (
+    cloudinary.exceptions.BadRequest,
+    cloudinary.exceptions.AuthorizationRequired,
+    cloudinary.exceptions.NotAllowed,
+    cloudinary.exceptions.NotFound,
+    cloudinary.exceptions.AlreadyExists
+)
+
+def _is_transient_error(result, error):
+    """
+    Indique si un échec d'appel Cloudinary peut être réessayé
+    (erreurs réseau, limitation de débit et erreurs serveur)
+    
+    Args:
+        result: Résultat de l'appel (None en cas d'exception)
+        error: Exception levée (None si l'appel a abouti)
+        
+    Returns:
+        True si l'échec est transitoire, False sinon
+    """
+    return isinstance(error, cloudinary.exceptions.Error) and not isinstance(error, NON_RETRYABLE_ERRORS)
+
+# Cache des derniers téléchargements, indexé par (empreinte du contenu, type de ressource)
+UPLOAD_CACHE_SIZE = 256
+_upload_cache = OrderedDict()
+_upload_cache_lock = threading.Lock()
+
+# Taille des blocs envoyés par upload_large : au-delà, le fichier est envoyé par morceaux
+# au lieu d'être chargé entièrement en mémoire
+UPLOAD_CHUNK_SIZE = 6000000  # 6MB
+
+# Nombre maximum de téléchargements simultanés vers Cloudinary, tous utilisateurs confondus
+MAX_CONCURRENT_UPLOADS = 4
+
+# Verrou pour limiter les téléchargements simultanés (mémoire et bande passante du worker)
+upload_semaphore = threading.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+def _upload(file_path, upload_params, file_size):
+    """
+    Envoie un fichier sur Cloudinary, par morceaux s'il dépasse UPLOAD_CHUNK_SIZE
+    
+    Args:
+        file_path: Chemin du fichier à télécharger
+        upload_params: Paramètres du téléchargement
+        file_size: Taille du fichier en octets
+        
+    Returns:
+        Résultat du téléchargement
+    """
+    with upload_semaphore:
+        if file_size > UPLOAD_CHUNK_SIZE:
+            return cloudinary.uploader.upload_large(file_path, **upload_params)
+        return cloudinary.uploader.upload(file_path, **upload_params)
+
 def _validate_file(file_path):
     """
     Valide un fichier avant le téléchargement
@@ -23,19 +82,20 @@ def _validate_file(file_path):
         file_path: Chemin du fichier à valider
         
     Returns:
-        Tuple (bool, str) indiquant si le fichier est valide et le type MIME
+        Tuple (bool, str, int) indiquant si le fichier est valide, le type MIME
+        (ou le message d'erreur) et la taille du fichier en octets
     """
-    # Vérifier si le fichier existe
-    if not os.path.exists(file_path):
-        return False, f"Le fichier n'existe pas: {file_path}"
+    # Vérifier l'existence et la taille du fichier en un seul appel système
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
+        return False, f"Le fichier n'existe pas: {file_path}", 0
     
-    # Vérifier la taille du fichier
-    file_size = os.path.getsize(file_path)
     if file_size == 0:
-        return False, f"Le fichier est vide: {file_path}"
+        return False, f"Le fichier est vide: {file_path}", file_size
     
     if file_size > 100 * 1024 * 1024:  # 100 MB
-        return False, f"Le fichier est trop volumineux: {file_size} octets"
+        return False, f"Le fichier est trop volumineux: {file_size} octets", file_size
     
     # Vérifier le type MIME
     mime_type, _ = mimetypes.guess_type(file_path)
@@ -51,7 +111,7 @@ def _validate_file(file_path):
     
     logger.info(f"Type MIME du fichier: {mime_type}")
     
-    return True, mime_type
+    return True, mime_type, file_size
 
 def upload_file(file_path, public_id=None, resource_type="auto"):
     """
@@ -73,14 +133,12 @@ def upload_file(file_path, public_id=None, resource_type="auto"):
             logger.error("Informations d'identification Cloudinary manquantes")
             return None
         
-        # Valider le fichier
-        is_valid, message_or_mime = _validate_file(file_path)
+        # Valider le fichier (la taille est lue par le même appel système)
+        is_valid, message_or_mime, file_size = _validate_file(file_path)
         if not is_valid:
             logger.error(message_or_mime)
             return None
         
-        # Vérifier la taille du fichier
-        file_size = os.path.getsize(file_path)
         logger.info(f"Taille du fichier: {file_size} octets")
         
         # Déterminer le type de ressource si auto
@@ -98,7 +156,7 @@ def upload_file(file_path, public_id=None, resource_type="auto"):
         # Télécharger le fichier
         upload_params = {
             "resource_type": resource_type,
-            "chunk_size": 6000000,  # 6MB par chunk pour les gros fichiers
+            "chunk_size": UPLOAD_CHUNK_SIZE,  # 6MB par chunk pour les gros fichiers
             "timeout": 120,  # 2 minutes de timeout
             "use_filename": True,  # Utiliser le nom du fichier original
             "unique_filename": True,  # Ajouter un suffixe unique
@@ -110,7 +168,7 @@ def upload_file(file_path, public_id=None, resource_type="auto"):
             upload_params["public_id"] = public_id
         
         try:
-            result = cloudinary.uploader.upload(file_path, **upload_params)
+            result = retry_with_backoff(lambda: _upload(file_path, upload_params, file_size), _is_transient_error)
             
             logger.info(f"Fichier téléchargé avec succès: {result.get('public_id')}")
             logger.info(f"URL du fichier: {result.get('secure_url')}")
@@ -123,7 +181,7 @@ def upload_file(file_path, public_id=None, resource_type="auto"):
                 logger.info(f"Tentative avec le type de ressource 'raw'")
                 upload_params["resource_type"] = "raw"
                 try:
-                    result = cloudinary.uploader.upload(file_path, **upload_params)
+                    result = retry_with_backoff(lambda: _upload(file_path, upload_params, file_size), _is_transient_error)
                     logger.info(f"Fichier téléchargé avec succès en tant que 'raw': {result.get('public_id')}")
                     logger.info(f"URL du fichier: {result.get('secure_url')}")
                     return result
@@ -134,10 +192,61 @@ def upload_file(file_path, public_id=None, resource_type="auto"):
             return None
             
     except Exception as e:
-        logger.error(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
         return None
 
+def _file_digest(file_path):
+    """
+    Calcule l'empreinte BLAKE2b du contenu d'un fichier, lu par blocs
+    
+    Args:
+        file_path: Chemin du fichier
+        
+    Returns:
+        Empreinte hexadécimale du contenu
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file_obj:
+        for block in iter(lambda: file_obj.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def upload_file_cached(file_path, public_id=None, resource_type="auto"):
+    """
+    Télécharge un fichier sur Cloudinary, sauf si un contenu identique vient déjà de l'être
+    (à réserver aux fichiers qui ne sont pas supprimés de Cloudinary ensuite)
+    
+    Args:
+        file_path: Chemin du fichier à télécharger
+        public_id: ID public pour le fichier (optionnel)
+        resource_type: Type de ressource (auto, image, video, raw)
+        
+    Returns:
+        Résultat du téléchargement
+    """
+    try:
+        cache_key = (_file_digest(file_path), resource_type)
+    except OSError as e:
+        logger.error(f"Impossible de calculer l'empreinte du fichier: {str(e)}")
+        return upload_file(file_path, public_id, resource_type)
+    
+    with _upload_cache_lock:
+        result = _upload_cache.get(cache_key)
+        if result is not None:
+            _upload_cache.move_to_end(cache_key)
+            logger.info(f"Fichier déjà présent sur Cloudinary: {result.get('public_id')}")
+            return result
+    
+    result = upload_file(file_path, public_id, resource_type)
+    
+    if result and result.get('secure_url'):
+        with _upload_cache_lock:
+            _upload_cache[cache_key] = result
+            if len(_upload_cache) > UPLOAD_CACHE_SIZE:
+                _upload_cache.popitem(last=False)
+    
+    return result
+
 def delete_file(public_id, resource_type="auto"):
     """
     Supprime un fichier de Cloudinary
@@ -163,7 +272,6 @@ def delete_file(public_id, resource_type="auto"):
         logger.info(f"Résultat de la suppression: {result}")
         return result
     except Exception as e:
-        logger.error(f"Erreur lors de la suppression du fichier: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erreur lors de la suppression du fichier: {str(e)}")
         return None
 
@@ -1,15 +1,17 @@
 import os
 import json
 import http.client
-import traceback
 import base64
 import tempfile
 import requests
 import time
 import threading
+import itertools
+from collections import deque
 from typing import Optional, Dict, Any, Callable
-from src.utils.logger import get_logger
-from src.cloudinary_service import upload_file
+from src.utils.logger import get_logger, lazy_json
+from src.utils.file_utils import get_file_size
+from src.cloudinary_service import upload_file_cached
 
 logger = get_logger(__name__)
 
@@ -20,16 +22,36 @@ RAPIDAPI_HOST = "chatgpt-42.p.rapidapi.com"
 # Alternative API host for image generation
 ALT_RAPIDAPI_HOST = "ai-image-generator3.p.rapidapi.com"
 
-# File d'attente pour les générations d'images
-image_queue = []
+# Délai maximum (en secondes) d'un appel de génération d'image
+GENERATION_TIMEOUT = 60
+
+# Taille des blocs lus et écrits lors du téléchargement d'une image
+DOWNLOAD_CHUNK_SIZE = 65536
+
+# File d'attente pour les générations d'images (traitée par plusieurs workers)
+image_queue = deque()
 image_queue_lock = threading.Lock()
 image_thread = None
 image_thread_running = False
+active_image_workers = 0
 
 # Nombre maximum de générations simultanées
 MAX_CONCURRENT_GENERATIONS = 3
 generation_semaphore = threading.Semaphore(MAX_CONCURRENT_GENERATIONS)
 
+# Compteur monotone pour les identifiants Cloudinary des images (uniques même si plusieurs
+# images se terminent dans la même seconde, Cloudinary écrasant les identifiants existants)
+_DALLE_COUNTER = itertools.count(int(time.time() * 1_000_000))
+
+def new_image_id() -> str:
+    """
+    Génère un identifiant Cloudinary unique pour une image générée
+    
+    Returns:
+        Identifiant de la forme dalle_<compteur>
+    """
+    return f"dalle_{next(_DALLE_COUNTER)}"
+
 def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional[Dict[str, Any]]:
     """
     Génère une image à partir d'un texte en utilisant l'API DALL-E via RapidAPI
@@ -60,7 +82,7 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
             "X-RapidAPI-Host": ALT_RAPIDAPI_HOST
         }
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = requests.post(url, json=payload, headers=headers, timeout=(3, GENERATION_TIMEOUT))
         
         if response.status_code == 200:
             response_data = response.json()
@@ -70,15 +92,14 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
         else:
             logger.warning(f"Échec de la génération d'image avec l'API alternative: {response.status_code} - {response.text}")
     except Exception as e:
-        logger.error(f"Erreur lors de la génération d'image avec l'API alternative: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la génération d'image avec l'API alternative: {str(e)}")
     
     # If alternative API fails, try with the original API
     try:
         logger.info(f"Génération d'image pour le prompt: {prompt}")
         
         # Créer la connexion HTTP
-        conn = http.client.HTTPSConnection(RAPIDAPI_HOST)
+        conn = http.client.HTTPSConnection(RAPIDAPI_HOST, timeout=GENERATION_TIMEOUT)
         
         # Préparer les données de la requête
         payload = json.dumps({
@@ -116,10 +137,19 @@ def generate_image(prompt: str, width: int = 512, height: int = 512) -> Optional
         
         return response_data
     except Exception as e:
-        logger.error(f"Erreur lors de la génération d'image: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la génération d'image: {str(e)}")
         return None
 
+def _temp_image_path() -> str:
+    """
+    Crée un fichier temporaire pour une image et referme aussitôt son descripteur
+    
+    Returns:
+        Chemin du fichier temporaire (à supprimer par l'appelant)
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
+        return temp_file.name
+
 def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
     """
     Sauvegarde l'image générée dans un fichier temporaire
@@ -154,8 +184,7 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
             return download_image_from_url(image_data["url"])
         elif "b64_json" in image_data:
             # Créer un fichier temporaire pour l'image
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            temp_file_path = temp_file.name
+            temp_file_path = _temp_image_path()
             
             # Décoder les données base64 et les écrire dans le fichier
             image_bytes = base64.b64decode(image_data["b64_json"])
@@ -166,8 +195,7 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
             return temp_file_path
         elif "data" in image_data:
             # Créer un fichier temporaire pour l'image
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            temp_file_path = temp_file.name
+            temp_file_path = _temp_image_path()
             
             # Vérifier si les données sont déjà en base64 ou non
             image_data_str = image_data["data"]
@@ -198,8 +226,7 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
                 return download_image_from_url(image_content)
             
             # Sinon, essayer de traiter comme base64
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            temp_file_path = temp_file.name
+            temp_file_path = _temp_image_path()
             
             try:
                 # Vérifier si les données sont déjà en base64 ou non
@@ -220,8 +247,7 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
                 else:
                     logger.error(f"Format de données d'image non reconnu dans la clé 'image': {type(image_content)}")
             except Exception as e:
-                logger.error(f"Erreur lors du traitement de l'image: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Erreur lors du traitement de l'image: {str(e)}")
             
             return None
         elif "imageUrl" in image_data:
@@ -241,8 +267,7 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
                     return download_image_from_url(result)
                 
                 # Sinon, essayer de traiter comme base64
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-                temp_file_path = temp_file.name
+                temp_file_path = _temp_image_path()
                 
                 try:
                     if "base64," in result:
@@ -284,17 +309,15 @@ def save_generated_image(image_data: Dict[str, Any]) -> Optional[str]:
                 # par son ID, selon la documentation de l'API que vous utilisez
             
             # Journaliser toutes les données pour le débogage
-            logger.info(f"Données d'image complètes: {json.dumps(image_data)}")
+            logger.info("Données d'image complètes: %s", lazy_json(image_data))
             
             logger.error("Format de données d'image non reconnu après analyse approfondie")
             return None
         except Exception as e:
-            logger.error(f"Erreur lors de l'analyse des données d'image: {str(e)}")
-            logger.error(traceback.format_exc())
+            logger.exception(f"Erreur lors de l'analyse des données d'image: {str(e)}")
             return None
     except Exception as e:
-        logger.error(f"Erreur lors de la sauvegarde de l'image: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la sauvegarde de l'image: {str(e)}")
         return None
 
 def download_image_from_url(url: str) -> Optional[str]:
@@ -311,8 +334,7 @@ def download_image_from_url(url: str) -> Optional[str]:
         logger.info(f"Téléchargement de l'image depuis: {url}")
         
         # Créer un fichier temporaire pour l'image
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        temp_file_path = temp_file.name
+        temp_file_path = _temp_image_path()
         
         # Télécharger l'image
         headers = {
@@ -337,16 +359,17 @@ def download_image_from_url(url: str) -> Optional[str]:
         response = requests.get(url, stream=True, timeout=30, headers=headers)
         
         if response.status_code == 200:
-            with open(temp_file_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
+            with open(temp_file_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
                     f.write(chunk)
             
             # Vérifier que le fichier a été téléchargé correctement
-            if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) > 100:
-                logger.info(f"Image téléchargée et sauvegardée dans: {temp_file_path} ({os.path.getsize(temp_file_path)} octets)")
+            file_size = get_file_size(temp_file_path)
+            if file_size > 100:
+                logger.info(f"Image téléchargée et sauvegardée dans: {temp_file_path} ({file_size} octets)")
                 return temp_file_path
             else:
-                logger.error(f"Fichier téléchargé invalide ou trop petit: {temp_file_path} ({os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 'N/A'} octets)")
+                logger.error(f"Fichier téléchargé invalide ou trop petit: {temp_file_path} ({file_size if file_size >= 0 else 'N/A'} octets)")
                 
                 # Si le téléchargement direct a échoué, essayer avec un proxy
                 try:
@@ -357,13 +380,14 @@ def download_image_from_url(url: str) -> Optional[str]:
                     proxy_response = requests.get(proxy_url, stream=True, timeout=30)
                     
                     if proxy_response.status_code == 200:
-                        with open(temp_file_path, 'wb') as f:
-                            for chunk in proxy_response.iter_content(1024):
+                        with open(temp_file_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                            for chunk in proxy_response.iter_content(DOWNLOAD_CHUNK_SIZE):
                                 f.write(chunk)
                         
                         # Vérifier que le fichier a été téléchargé correctement
-                        if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) > 100:
-                            logger.info(f"Image téléchargée via proxy et sauvegardée dans: {temp_file_path} ({os.path.getsize(temp_file_path)} octets)")
+                        file_size = get_file_size(temp_file_path)
+                        if file_size > 100:
+                            logger.info(f"Image téléchargée via proxy et sauvegardée dans: {temp_file_path} ({file_size} octets)")
                             return temp_file_path
                 except Exception as proxy_error:
                     logger.error(f"Erreur lors du téléchargement via proxy: {str(proxy_error)}")
@@ -405,21 +429,21 @@ def download_image_from_url(url: str) -> Optional[str]:
                 proxy_response = requests.get(proxy_url, stream=True, timeout=30)
                 
                 if proxy_response.status_code == 200:
-                    with open(temp_file_path, 'wb') as f:
-                        for chunk in proxy_response.iter_content(1024):
+                    with open(temp_file_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                        for chunk in proxy_response.iter_content(DOWNLOAD_CHUNK_SIZE):
                             f.write(chunk)
                     
                     # Vérifier que le fichier a été téléchargé correctement
-                    if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) > 100:
-                        logger.info(f"Image téléchargée via proxy et sauvegardée dans: {temp_file_path} ({os.path.getsize(temp_file_path)} octets)")
+                    file_size = get_file_size(temp_file_path)
+                    if file_size > 100:
+                        logger.info(f"Image téléchargée via proxy et sauvegardée dans: {temp_file_path} ({file_size} octets)")
                         return temp_file_path
             except Exception as proxy_error:
                 logger.error(f"Erreur lors du téléchargement via proxy: {str(proxy_error)}")
             
             return None
     except Exception as e:
-        logger.error(f"Erreur lors du téléchargement de l'image: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors du téléchargement de l'image: {str(e)}")
         return None
 
 def generate_and_upload_image(prompt: str, callback: Callable[[str], None]):
@@ -446,8 +470,7 @@ def generate_and_upload_image(prompt: str, callback: Callable[[str], None]):
         
         return True
     except Exception as e:
-        logger.error(f"Erreur lors de l'ajout de la génération d'image à la file d'attente: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'ajout de la génération d'image à la file d'attente: {str(e)}")
         
         if callback:
             callback(None)
@@ -456,25 +479,31 @@ def generate_and_upload_image(prompt: str, callback: Callable[[str], None]):
 
 def start_image_thread():
     """
-    Démarre le thread de traitement des générations d'images
+    Démarre un thread de traitement des générations d'images, dans la limite
+    de MAX_CONCURRENT_GENERATIONS threads actifs
     """
-    global image_thread, image_thread_running
+    global image_thread, image_thread_running, active_image_workers
     
-    if image_thread_running:
-        return
+    with image_queue_lock:
+        if active_image_workers >= MAX_CONCURRENT_GENERATIONS:
+            return
+        active_image_workers += 1
+        image_thread_running = True
     
-    image_thread_running = True
     image_thread = threading.Thread(target=process_image_queue)
     image_thread.daemon = True
     image_thread.start()
     
-    logger.info("Thread de génération d'images démarré")
+    logger.info(f"Thread de génération d'images démarré ({active_image_workers} actifs)")
 
 def process_image_queue():
     """
     Traite la file d'attente des générations d'images
     """
-    global image_thread_running
+    global image_thread_running, active_image_workers
+    
+    # Indique si ce thread est encore compté dans active_image_workers
+    registered = True
     
     try:
         logger.info("Démarrage du traitement de la file d'attente des générations d'images")
@@ -483,12 +512,15 @@ def process_image_queue():
             # Vérifier s'il y a des générations dans la file d'attente
             with image_queue_lock:
                 if not image_queue:
+                    # Se retirer sous le même verrou pour qu'un ajout concurrent démarre un nouveau thread
                     logger.info("File d'attente vide, arrêt du thread")
-                    image_thread_running = False
+                    active_image_workers -= 1
+                    image_thread_running = active_image_workers > 0
+                    registered = False
                     break
                 
                 # Récupérer la prochaine génération
-                generation = image_queue.pop(0)
+                generation = image_queue.popleft()
             
             # Traiter la génération
             prompt = generation['prompt']
@@ -508,12 +540,12 @@ def process_image_queue():
                     image_path = save_generated_image(image_data)
                     
                     if image_path:
-                        # Si c'est un chemin de fichier, vérifier qu'il existe
-                        if os.path.exists(image_path):
+                        # Si c'est un chemin de fichier, vérifier qu'il existe et n'est pas vide
+                        if get_file_size(image_path) > 0:
                             try:
                                 # Télécharger l'image sur Cloudinary
-                                image_id = f"dalle_{int(time.time())}"
-                                cloudinary_result = upload_file(image_path, image_id, "image")
+                                image_id = new_image_id()
+                                cloudinary_result = upload_file_cached(image_path, image_id, "image")
                                 
                                 if cloudinary_result and cloudinary_result.get('secure_url'):
                                     image_url = cloudinary_result.get('secure_url')
@@ -527,8 +559,7 @@ def process_image_queue():
                                     if callback:
                                         callback(image_path)
                             except Exception as e:
-                                logger.error(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
-                                logger.error(traceback.format_exc())
+                                logger.exception(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
                                 if callback:
                                     callback(image_path)
                         else:
@@ -545,8 +576,7 @@ def process_image_queue():
                     if callback:
                         callback(None)
             except Exception as e:
-                logger.error(f"Erreur lors de la génération d'image: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Erreur lors de la génération d'image: {str(e)}")
                 
                 if callback:
                     callback(None)
@@ -557,10 +587,12 @@ def process_image_queue():
             # Attendre un peu pour éviter de surcharger le système
             time.sleep(0.5)
     except Exception as e:
-        logger.error(f"Erreur dans le thread de génération d'images: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur dans le thread de génération d'images: {str(e)}")
     finally:
-        image_thread_running = False
+        if registered:
+            with image_queue_lock:
+                active_image_workers -= 1
+                image_thread_running = active_image_workers > 0
         logger.info("Thread de génération d'images arrêté")
 
 def stop_image_thread():
@@ -1,4 +1,5 @@
 import os
+import time
 import pymongo
 from pymongo import MongoClient
 from src.utils.logger import get_logger
@@ -8,6 +9,16 @@ logger = get_logger(__name__)
 # Variable globale pour stocker la connexion à la base de données
 _db = None
 
+# Délai (en secondes) avant une nouvelle tentative de connexion après un échec :
+# une base injoignable ne doit pas bloquer chaque message pendant le délai de sélection du serveur
+RECONNECT_DELAY = 30
+
+# Date (time.monotonic) du dernier échec de connexion, None si aucun échec
+_last_failure = None
+
+# Durée de conservation des états des utilisateurs sans activité (en secondes)
+USER_STATE_TTL = 3600
+
 def connect_to_database():
     """
     Établit une connexion à la base de données MongoDB
@@ -15,11 +26,15 @@ def connect_to_database():
     Returns:
         Instance de la base de données MongoDB
     """
-    global _db
+    global _db, _last_failure
     
     if _db is not None:
         return _db
     
+    # Ne pas retenter la connexion tant que le dernier échec est récent
+    if _last_failure is not None and time.monotonic() - _last_failure < RECONNECT_DELAY:
+        return None
+    
     try:
         # Récupérer l'URL de connexion depuis les variables d'environnement
         mongo_uri = os.environ.get("MONGODB_URI")
@@ -28,24 +43,29 @@ def connect_to_database():
             logger.error("Variable d'environnement MONGODB_URI manquante")
             return None
         
-        # Établir la connexion
-        client = MongoClient(mongo_uri)
+        # Établir la connexion (délais courts : l'état utilisateur est lu à chaque message)
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000, connectTimeoutMS=5000, socketTimeoutMS=10000)
         
         # Sélectionner la base de données
         db_name = os.environ.get("MONGODB_DB_NAME", "chatbot")
-        _db = client[db_name]
+        db = client[db_name]
         
         # Vérifier la connexion
         client.admin.command('ping')
         logger.info(f"Connexion à la base de données MongoDB établie: {db_name}")
         
         # Créer les index nécessaires
-        _db.conversations.create_index("user_id", unique=True)
-        _db.conversations.create_index("updated_at")
+        db.conversations.create_index("user_id", unique=True)
+        db.conversations.create_index("updated_at")
+        
+        # Les états des utilisateurs expirent après USER_STATE_TTL secondes d'inactivité
+        db.user_states.create_index("updated_at", expireAfterSeconds=USER_STATE_TTL)
         
+        _db = db
         return _db
     except Exception as e:
-        logger.error(f"Erreur lors de la connexion à MongoDB: {str(e)}")
+        _last_failure = time.monotonic()
+        logger.error(f"Erreur lors de la connexion à MongoDB (nouvelle tentative dans {RECONNECT_DELAY} secondes): {str(e)}")
         return None
 
 def get_database():
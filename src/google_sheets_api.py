@@ -1,7 +1,6 @@
 import os
 import json
 import requests
-import traceback
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
@@ -41,8 +40,7 @@ def get_google_sheets_client():
         
         return client
     except Exception as e:
-        logger.error(f"Erreur lors de l'initialisation du client Google Sheets: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'initialisation du client Google Sheets: {str(e)}")
         return None
 
 def add_imdb_request_to_sheet(user_id: str, user_name: str, imdb_data: Dict[str, Any]) -> bool:
@@ -111,8 +109,7 @@ def add_imdb_request_to_sheet(user_id: str, user_name: str, imdb_data: Dict[str,
         logger.info(f"Demande IMDb ajoutée avec succès à Google Sheets")
         return True
     except Exception as e:
-        logger.error(f"Erreur lors de l'ajout de la demande IMDb à Google Sheets: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'ajout de la demande IMDb à Google Sheets: {str(e)}")
         return False
 
 def get_imdb_requests(user_id: str) -> List[Dict[str, Any]]:
@@ -155,6 +152,5 @@ def get_imdb_requests(user_id: str) -> List[Dict[str, Any]]:
         logger.info(f"Récupération de {len(user_requests)} demandes IMDb pour l'utilisateur {user_id}")
         return user_requests
     except Exception as e:
-        logger.error(f"Erreur lors de la récupération des demandes IMDb: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la récupération des demandes IMDb: {str(e)}")
         return []
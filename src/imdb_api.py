@@ -1,10 +1,9 @@
 import os
 import json
 import requests
-import traceback
 import re
 from typing import List, Dict, Any, Optional
-from src.utils.logger import get_logger
+from src.utils.logger import get_logger, lazy_json
 
 logger = get_logger(__name__)
 
@@ -12,6 +11,9 @@ logger = get_logger(__name__)
 RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY', "df674bbd36msh112ab45b7712473p16f9abjsn062262165208")
 RAPIDAPI_HOST = "imdb8.p.rapidapi.com"
 
+# Délais (connexion, lecture) des appels à l'API IMDb
+REQUEST_TIMEOUT = (3, 10)
+
 # URL d'image par défaut garantie fonctionnelle pour Messenger
 DEFAULT_IMAGE_URL = "https://m.media-amazon.com/images/M/MV5BMTg1MTY2MjYzNV5BMl5BanBnXkFtZTgwMTc4NTMwNDI@._V1_UX182_CR0,0,182,268_AL_.jpg"
 
@@ -40,7 +42,7 @@ def search_imdb(query: str, limit: int = 5) -> List[Dict[str, Any]]:
         }
         
         # Faire la requête à l'API
-        response = requests.get(url, headers=headers, params=querystring)
+        response = requests.get(url, headers=headers, params=querystring, timeout=REQUEST_TIMEOUT)
         
         if response.status_code != 200:
             logger.error(f"Erreur lors de la recherche IMDb: {response.status_code} - {response.text}")
@@ -48,7 +50,7 @@ def search_imdb(query: str, limit: int = 5) -> List[Dict[str, Any]]:
         
         # Analyser la réponse
         data = response.json()
-        logger.info(f"Réponse brute de l'API IMDb: {json.dumps(data)[:500]}...")
+        logger.info("Réponse brute de l'API IMDb: %s...", lazy_json(data, limit=500))
         
         # Extraire les résultats
         results = []
@@ -89,8 +91,7 @@ def search_imdb(query: str, limit: int = 5) -> List[Dict[str, Any]]:
         
         return results
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche IMDb: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la recherche IMDb: {str(e)}")
         return generate_mock_results(query, limit)
 
 def generate_mock_results(query: str, limit: int = 5) -> List[Dict[str, Any]]:
@@ -162,7 +163,7 @@ def get_imdb_details(imdb_id: str) -> Optional[Dict[str, Any]]:
         }
         
         # Faire la requête à l'API
-        response = requests.get(url, headers=headers, params=querystring)
+        response = requests.get(url, headers=headers, params=querystring, timeout=REQUEST_TIMEOUT)
         
         if response.status_code != 200:
             logger.error(f"Erreur lors de la récupération des détails IMDb: {response.status_code} - {response.text}")
@@ -170,7 +171,7 @@ def get_imdb_details(imdb_id: str) -> Optional[Dict[str, Any]]:
         
         # Analyser la réponse
         data = response.json()
-        logger.info(f"Réponse brute des détails IMDb: {json.dumps(data)[:500]}...")
+        logger.info("Réponse brute des détails IMDb: %s...", lazy_json(data, limit=500))
         
         # Extraire les détails
         title = data.get("title", {}).get("title", "")
@@ -210,8 +211,7 @@ def get_imdb_details(imdb_id: str) -> Optional[Dict[str, Any]]:
             "plot": plot
         }
     except Exception as e:
-        logger.error(f"Erreur lors de la récupération des détails IMDb: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la récupération des détails IMDb: {str(e)}")
         return generate_mock_details(imdb_id)
 
 def generate_mock_details(imdb_id: str) -> Dict[str, Any]:
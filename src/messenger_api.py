@@ -1,20 +1,33 @@
 import os
+import re
 import json
 import requests
-import traceback
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests_toolbelt import MultipartEncoder
 import tempfile
-import time
 import shutil
+import atexit
+import time
+import mimetypes
+import threading
+import queue
 import subprocess
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from cachetools import TTLCache
 from typing import Dict, Any, Optional
-from src.utils.logger import get_logger
+from src.utils.logger import get_logger, lazy_json
+from src.utils.retry import retry_with_backoff
+from src.utils import json_utils
 from src.mistral_api import generate_mistral_response
 from src.conversation_memory import clear_user_history
-from src.youtube_api import search_youtube, download_youtube_video
-from src.cloudinary_service import upload_file, delete_file
-from src.dalle_api import generate_image, save_generated_image, generate_and_upload_image
-from src.imdb_api import search_imdb, get_imdb_details
-from src.google_sheets_api import add_imdb_request_to_sheet, get_imdb_requests
+from src.youtube_api import search_youtube, download_youtube_video, get_video_details
+from src.cloudinary_service import upload_file, upload_file_cached, delete_file
+from src.dalle_api import generate_and_upload_image, new_image_id
+from src.imdb_api import search_imdb, get_imdb_details, DEFAULT_IMAGE_URL
+from src.models.user_state import UserStateStore
 
 logger = get_logger(__name__)
 
@@ -30,46 +43,187 @@ if MESSENGER_ACCESS_TOKEN:
 else:
     logger.warning("Token d'accès Messenger manquant. Vérifiez les variables d'environnement MESSENGER_ACCESS_TOKEN ou MESSENGER_PAGE_ACCESS_TOKEN")
 
-def send_text_message(recipient_id, text):
+# Codes HTTP de l'API Graph considérés comme transitoires (limitation de débit et erreurs serveur)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Codes réessayés automatiquement sur la session partagée : seuls ceux qui garantissent que l'envoi
+# n'a pas été traité (une réponse 500/502/504 peut suivre un message déjà remis, renvoyé en double)
+SESSION_RETRY_STATUS_CODES = (429, 503)
+
+# Délais (connexion, lecture) des appels à l'API Graph : un appel bloqué ne doit pas
+# immobiliser un thread d'envoi indéfiniment. Les envois de fichiers ont un délai de lecture plus long
+GRAPH_TIMEOUT = (3, 10)
+UPLOAD_TIMEOUT = (3, 120)
+
+# Taille du tampon de lecture des fichiers envoyés (lectures disque de 64 Kio pendant l'envoi multipart)
+UPLOAD_BUFFER_SIZE = 65536
+
+# Session HTTP partagée : les connexions TLS vers graph.facebook.com sont réutilisées (keep-alive)
+# Les échecs de connexion et les codes 429/503 sont réessayés par urllib3 (corps JSON rejouables)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=SESSION_RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False
+    )
+))
+
+# Session pour les envois multipart en flux : un corps déjà lu ne peut pas être rejoué par urllib3,
+# les réessais sont faits par retry_with_backoff qui reconstruit la requête
+_UPLOAD_SESSION = requests.Session()
+_UPLOAD_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0))
+
+# Pool de threads partagé pour paralléliser les appels réseau indépendants
+_IO_POOL = ThreadPoolExecutor(max_workers=8)
+
+# Pool dédié aux callbacks de génération : le thread de génération d'images est libéré immédiatement
+# (pool distinct de _IO_POOL : un callback occupe son thread pendant tous ses envois)
+_CALLBACK_POOL = ThreadPoolExecutor(max_workers=4)
+
+# Pool dédié aux téléchargements anticipés sur Cloudinary : ces envois longs ne doivent pas
+# occuper les threads de _IO_POOL utilisés pour les envois courts
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=2)
+
+# Taille (en octets) à partir de laquelle la vidéo est téléchargée sur Cloudinary par anticipation :
+# Messenger refuse les pièces jointes de plus de 25 Mo et l'envoi direct des gros fichiers échoue souvent
+SPECULATIVE_UPLOAD_MIN_SIZE = 20 * 1024 * 1024
+
+# URLs de l'API Graph construites une seule fois (le token ne change pas à l'exécution)
+MESSENGER_SEND_URL = f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}"
+MESSENGER_PROFILE_URL = f"https://graph.facebook.com/v18.0/me/messenger_profile?access_token={MESSENGER_ACCESS_TOKEN}"
+GRAPH_BATCH_URL = f"https://graph.facebook.com/v18.0/?access_token={MESSENGER_ACCESS_TOKEN}"
+
+# En-têtes partagés par tous les envois JSON
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Préfixe des liens YouTube et format d'un ID de vidéo valide (11 caractères)
+YOUTUBE_WATCH_URL = "https://www.youtube.com/watch?v="
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def _is_transient_graph_error(response, error):
     """
-    Envoie un message texte à un utilisateur
+    Indique si un appel à l'API Graph peut être réessayé : seuls les échecs de connexion
+    (requête jamais reçue) et les codes transitoires le sont. Un délai de lecture dépassé
+    n'est pas réessayé, l'API a pu accepter l'envoi (pièce jointe en double)
+    
+    Args:
+        response: Réponse HTTP obtenue (None en cas d'exception)
+        error: Exception levée (None si la requête a abouti)
+        
+    Returns:
+        True si l'échec est transitoire, False sinon
+    """
+    if error is not None:
+        return isinstance(error, requests.ConnectionError) and not isinstance(error, requests.ReadTimeout)
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+@lru_cache(maxsize=2048)
+def _recipient(recipient_id):
+    """
+    Retourne le champ recipient d'un destinataire, construit une seule fois par utilisateur
+    (partagé entre les envois : ne pas le modifier)
+    
+    Args:
+        recipient_id: ID du destinataire
+        
+    Returns:
+        Dictionnaire {"id": recipient_id}
+    """
+    return {"id": recipient_id}
+
+@lru_cache(maxsize=2048)
+def _recipient_json(recipient_id):
+    """
+    Retourne le champ recipient sérialisé en JSON (envois multipart et groupés)
     
     Args:
         recipient_id: ID du destinataire
-        text: Texte du message
+        
+    Returns:
+        Chaîne JSON {"id": recipient_id}
+    """
+    return json.dumps(_recipient(recipient_id))
+
+def _post_message(payload, description, success_message=None):
+    """
+    Envoie un payload JSON à l'API Send de Messenger
+    
+    Args:
+        payload: Payload complet (destinataire et message ou action)
+        description: Description de l'envoi pour les journaux (ex: "du message")
+        success_message: Message journalisé en cas de succès (optionnel)
         
     Returns:
         Réponse de l'API ou None en cas d'erreur
     """
     try:
-        logger.info(f"Envoi d'un message texte à {recipient_id}: {text[:50]}...")
-        
         if not MESSENGER_ACCESS_TOKEN:
             logger.error("Token d'accès Messenger manquant")
             return None
         
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {"text": text}
-        }
-        
-        response = requests.post(
-            f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}",
-            headers={"Content-Type": "application/json"},
-            json=payload
+        response = _SESSION.post(
+            MESSENGER_SEND_URL,
+            headers=JSON_HEADERS,
+            data=json_utils.dumps(payload),
+            timeout=GRAPH_TIMEOUT
         )
         
         if response.status_code != 200:
-            logger.error(f"Erreur lors de l'envoi du message: {response.status_code} - {response.text}")
+            logger.error(f"Erreur lors de l'envoi {description}: {response.status_code} - {response.text}")
             return None
         
-        logger.info(f"Message envoyé avec succès: {response.json()}")
-        return response.json()
+        response_data = json_utils.loads(response.content)
+        if success_message:
+            logger.info("%s avec succès: %s", success_message, response_data)
+        return response_data
     except Exception as e:
-        logger.error(f"Erreur lors de l'envoi du message: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'envoi {description}: {str(e)}")
         return None
 
+def _attachment_message(attachment_type, url):
+    """
+    Construit un message contenant une pièce jointe désignée par son URL
+    
+    Args:
+        attachment_type: Type de pièce jointe (image, video, audio, file)
+        url: URL de la pièce jointe
+        
+    Returns:
+        Message à placer dans le payload
+    """
+    return {
+        "attachment": {
+            "type": attachment_type,
+            "payload": {
+                "url": url,
+                "is_reusable": True
+            }
+        }
+    }
+
+def send_text_message(recipient_id, text):
+    """
+    Envoie un message texte à un utilisateur
+    
+    Args:
+        recipient_id: ID du destinataire
+        text: Texte du message
+        
+    Returns:
+        Réponse de l'API ou None en cas d'erreur
+    """
+    logger.info(f"Envoi d'un message texte à {recipient_id}: {text[:50]}...")
+    payload = {"recipient": _recipient(recipient_id), "message": {"text": text}}
+    return _post_message(payload, "du message", "Message envoyé")
+
 def send_image_message(recipient_id, image_url):
     """
     Envoie une image à un utilisateur
@@ -81,42 +235,9 @@ def send_image_message(recipient_id, image_url):
     Returns:
         Réponse de l'API ou None en cas d'erreur
     """
-    try:
-        logger.info(f"Envoi d'une image à {recipient_id}: {image_url}")
-        
-        if not MESSENGER_ACCESS_TOKEN:
-            logger.error("Token d'accès Messenger manquant")
-            return None
-        
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {
-                "attachment": {
-                    "type": "image",
-                    "payload": {
-                        "url": image_url,
-                        "is_reusable": True
-                    }
-                }
-            }
-        }
-        
-        response = requests.post(
-            f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}",
-            headers={"Content-Type": "application/json"},
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Erreur lors de l'envoi de l'image: {response.status_code} - {response.text}")
-            return None
-        
-        logger.info(f"Image envoyée avec succès: {response.json()}")
-        return response.json()
-    except Exception as e:
-        logger.error(f"Erreur lors de l'envoi de l'image: {str(e)}")
-        logger.error(traceback.format_exc())
-        return None
+    logger.info(f"Envoi d'une image à {recipient_id}: {image_url}")
+    payload = {"recipient": _recipient(recipient_id), "message": _attachment_message("image", image_url)}
+    return _post_message(payload, "de l'image", "Image envoyée")
 
 def send_video_message(recipient_id, video_url):
     """
@@ -129,42 +250,34 @@ def send_video_message(recipient_id, video_url):
     Returns:
         Réponse de l'API ou None en cas d'erreur
     """
-    try:
-        logger.info(f"Envoi d'une vidéo à {recipient_id}: {video_url}")
-        
-        if not MESSENGER_ACCESS_TOKEN:
-            logger.error("Token d'accès Messenger manquant")
-            return None
-        
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {
-                "attachment": {
-                    "type": "video",
-                    "payload": {
-                        "url": video_url,
-                        "is_reusable": True
-                    }
-                }
-            }
-        }
-        
-        response = requests.post(
-            f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}",
-            headers={"Content-Type": "application/json"},
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Erreur lors de l'envoi de la vidéo: {response.status_code} - {response.text}")
-            return None
+    logger.info(f"Envoi d'une vidéo à {recipient_id}: {video_url}")
+    payload = {"recipient": _recipient(recipient_id), "message": _attachment_message("video", video_url)}
+    return _post_message(payload, "de la vidéo", "Vidéo envoyée")
+
+def send_sender_action(recipient_id, action):
+    """
+    Envoie une action d'expéditeur (typing_on, typing_off, mark_seen) à un utilisateur
+    
+    Args:
+        recipient_id: ID du destinataire
+        action: Action à afficher
         
-        logger.info(f"Vidéo envoyée avec succès: {response.json()}")
-        return response.json()
-    except Exception as e:
-        logger.error(f"Erreur lors de l'envoi de la vidéo: {str(e)}")
-        logger.error(traceback.format_exc())
-        return None
+    Returns:
+        Réponse de l'API ou None en cas d'erreur
+    """
+    payload = {"recipient": _recipient(recipient_id), "sender_action": action}
+    return _post_message(payload, f"de l'action {action}")
+
+# Type MIME et type de pièce jointe par extension, pour les fichiers inconnus de mimetypes
+_EXTENSION_ATTACHMENTS = {
+    ext: (f"{kind}/{ext[1:]}", kind)
+    for kind, extensions in (
+        ("video", ('.mp4', '.mov', '.avi', '.wmv', '.flv')),
+        ("image", ('.jpg', '.jpeg', '.png', '.gif', '.webp')),
+        ("audio", ('.mp3', '.wav', '.ogg', '.m4a'))
+    )
+    for ext in extensions
+}
 
 def send_file_attachment(recipient_id, file_path, attachment_type="file"):
     """
@@ -191,30 +304,18 @@ def send_file_attachment(recipient_id, file_path, attachment_type="file"):
             return None
         
         # Déterminer le type MIME
-        import mimetypes
         mime_type, _ = mimetypes.guess_type(file_path)
         
         if not mime_type:
-            # Si le type MIME ne peut pas être déterminé, essayer de le deviner à partir de l'extension
+            # Si le type MIME ne peut pas être déterminé, le déduire de l'extension
             ext = os.path.splitext(file_path)[1].lower()
-            if ext in ['.mp4', '.mov', '.avi', '.wmv', '.flv']:
-                mime_type = f"video/{ext[1:]}"
-                attachment_type = "video"
-            elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-                mime_type = f"image/{ext[1:]}"
-                attachment_type = "image"
-            elif ext in ['.mp3', '.wav', '.ogg', '.m4a']:
-                mime_type = f"audio/{ext[1:]}"
-                attachment_type = "audio"
-            else:
-                mime_type = "application/octet-stream"
-                attachment_type = "file"
+            mime_type, attachment_type = _EXTENSION_ATTACHMENTS.get(ext, ("application/octet-stream", "file"))
         
         # Préparer les données multipart
-        url = f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}"
+        url = MESSENGER_SEND_URL
         
         payload = {
-            "recipient": json.dumps({"id": recipient_id}),
+            "recipient": _recipient_json(recipient_id),
             "message": json.dumps({
                 "attachment": {
                     "type": attachment_type,
@@ -225,35 +326,279 @@ def send_file_attachment(recipient_id, file_path, attachment_type="file"):
             })
         }
         
-        files = {
-            "filedata": (os.path.basename(file_path), open(file_path, "rb"), mime_type)
-        }
-        
-        # Envoyer la requête
-        response = requests.post(url, data=payload, files=files)
-        
+        def post_attachment():
+            # Rouvrir le fichier à chaque tentative pour renvoyer le contenu complet ;
+            # le corps multipart est lu par blocs pendant l'envoi au lieu d'être construit en mémoire
+            with open(file_path, "rb", buffering=UPLOAD_BUFFER_SIZE) as file_obj:
+                encoder = MultipartEncoder(fields={
+                    **payload,
+                    "filedata": (os.path.basename(file_path), file_obj, mime_type)
+                })
+                return _UPLOAD_SESSION.post(url, data=encoder, headers={"Content-Type": encoder.content_type}, timeout=UPLOAD_TIMEOUT)
+
+        # Envoyer la requête (les erreurs transitoires sont réessayées)
+        response = retry_with_backoff(post_attachment, _is_transient_graph_error)
+
         if response.status_code != 200:
             logger.error(f"Erreur lors de l'envoi du fichier: {response.status_code} - {response.text}")
             return None
         
-        logger.info(f"Fichier envoyé avec succès: {response.json()}")
-        return response.json()
+        response_data = json_utils.loads(response.content)
+        logger.info("Fichier envoyé avec succès: %s", response_data)
+        return response_data
+    except Exception as e:
+        logger.exception(f"Erreur lors de l'envoi du fichier: {str(e)}")
+        return None
+
+# Nombre maximum de sous-requêtes par appel à l'endpoint batch de l'API Graph
+GRAPH_BATCH_LIMIT = 50
+
+def send_batch(recipient_id, messages):
+    """
+    Envoie plusieurs messages à un utilisateur en une seule requête (endpoint batch de l'API Graph)
+    
+    Args:
+        recipient_id: ID du destinataire
+        messages: Liste des messages à envoyer, dans l'ordre d'affichage
+            (envoyés par lots successifs de GRAPH_BATCH_LIMIT messages)
+        
+    Returns:
+        Liste des réponses de chaque sous-requête (None pour une sous-requête non exécutée) ou None en cas d'erreur
+    """
+    try:
+        logger.info(f"Envoi groupé de {len(messages)} messages à {recipient_id}")
+        
+        if not MESSENGER_ACCESS_TOKEN:
+            logger.error("Token d'accès Messenger manquant")
+            return None
+        
+        recipient = _recipient_json(recipient_id)
+        
+        results = []
+        for start in range(0, len(messages), GRAPH_BATCH_LIMIT):
+            # Chaîner les sous-requêtes avec depends_on pour conserver l'ordre des messages
+            batch = []
+            for i, message in enumerate(messages[start:start + GRAPH_BATCH_LIMIT]):
+                # Sans omit_response_on_success, l'API Graph renvoie null pour toute sous-requête
+                # dont une autre dépend : le demander sur chaque sous-requête pour vérifier leur succès
+                operation = {
+                    "method": "POST",
+                    "name": f"msg{i}",
+                    "relative_url": "me/messages",
+                    "body": urlencode({"recipient": recipient, "message": json_utils.dumps(message)}),
+                    "omit_response_on_success": False
+                }
+                if i > 0:
+                    operation["depends_on"] = f"msg{i-1}"
+                batch.append(operation)
+            
+            response = _SESSION.post(
+                GRAPH_BATCH_URL,
+                data={"batch": json_utils.dumps(batch), "include_headers": "false"},
+                timeout=GRAPH_TIMEOUT
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Erreur lors de l'envoi groupé: {response.status_code} - {response.text}")
+                if not results:
+                    return None
+                # Les lots suivants ne sont pas envoyés pour ne pas rompre l'ordre des messages
+                results.extend([None] * (len(messages) - len(results)))
+                break
+            
+            chunk_results = json_utils.loads(response.content)
+            for i, result in enumerate(chunk_results, start):
+                if not result or result.get('code') != 200:
+                    logger.error(f"Échec du message {i+1}/{len(messages)} de l'envoi groupé: {result}")
+            results.extend(chunk_results)
+        
+        logger.info(f"Envoi groupé terminé: {len(results)} réponses")
+        return results
     except Exception as e:
-        logger.error(f"Erreur lors de l'envoi du fichier: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'envoi groupé: {str(e)}")
         return None
 
-# Dictionnaire pour stocker l'état des utilisateurs
-user_states = {}
+class _LockedTTLCache(TTLCache):
+    """
+    TTLCache protégé par un verrou : ses structures internes (ordre d'expiration)
+    sont modifiées à chaque accès et ne supportent pas les accès concurrents
+    """
+    
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize, ttl)
+        self._lock = threading.RLock()
+    
+    def __getitem__(self, key):
+        with self._lock:
+            return super().__getitem__(key)
+    
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+    
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+    
+    def __contains__(self, key):
+        with self._lock:
+            return super().__contains__(key)
+    
+    def get(self, key, default=None):
+        with self._lock:
+            return super().get(key, default)
+
+# États des utilisateurs, partagés entre les workers via MongoDB (oubliés après une heure d'inactivité)
+user_states = UserStateStore()
+
+# Téléchargements en cours (un indicateur bloqué après un plantage expire au bout de 30 minutes)
+pending_downloads = _LockedTTLCache(maxsize=10000, ttl=1800)
+
+# Générations d'images en cours (expirent au bout de 5 minutes)
+pending_images = _LockedTTLCache(maxsize=10000, ttl=300)
+
+# Recherches IMDb en cours
+imdb_searches = _LockedTTLCache(maxsize=10000, ttl=3600)
+
+# Verrous répartis par utilisateur : rendent atomiques les vérifications « déjà en cours »
+# de pending_images / pending_downloads sans sérialiser tous les utilisateurs sur un seul verrou
+_SHARDS = [threading.Lock() for _ in range(16)]
+
+def _shard(sender_id):
+    """
+    Retourne le verrou associé à un utilisateur
+    
+    Args:
+        sender_id: ID de l'utilisateur
+        
+    Returns:
+        Verrou du groupe de l'utilisateur
+    """
+    return _SHARDS[hash(sender_id) & 15]
+
+# File des fichiers et répertoires temporaires à nettoyer, vidée par un thread dédié
+# (la suppression ne bloque plus les callbacks une fois le média envoyé)
+_CLEANUP_QUEUE = queue.Queue()
+
+def _cleanup_worker():
+    """
+    Supprime en arrière-plan les fichiers temporaires placés dans _CLEANUP_QUEUE
+    et rend au pool les répertoires de téléchargement
+    """
+    while True:
+        paths = [_CLEANUP_QUEUE.get()]
+        # Regrouper les fichiers déjà en attente pour les supprimer en une seule passe
+        while True:
+            try:
+                paths.append(_CLEANUP_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        for path in paths:
+            try:
+                if path in _TEMP_DIRS:
+                    _release_temp_dir(path)
+                    logger.info(f"Répertoire temporaire nettoyé : {path}")
+                else:
+                    os.remove(path)
+                    logger.info(f"Fichier temporaire nettoyé : {path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Erreur lors du nettoyage du fichier temporaire: {str(e)}")
+
+threading.Thread(target=_cleanup_worker, daemon=True).start()
+
+# Répertoires temporaires de téléchargement, réutilisés d'une vidéo à l'autre
+# au lieu d'être créés puis supprimés à chaque demande
+TEMP_DIR_POOL_SIZE = 8
+_TEMP_DIR_POOL = queue.Queue()
+_TEMP_DIRS = set()
+
+def _acquire_temp_dir():
+    """
+    Récupère un répertoire temporaire libre du pool (ou en crée un)
+    
+    Returns:
+        Chemin du répertoire temporaire
+    """
+    try:
+        return _TEMP_DIR_POOL.get_nowait()
+    except queue.Empty:
+        temp_dir = tempfile.mkdtemp(prefix="ytbot-")
+        _TEMP_DIRS.add(temp_dir)
+        return temp_dir
+
+def _release_temp_dir(temp_dir):
+    """
+    Vide un répertoire temporaire et le remet dans le pool
+    
+    Args:
+        temp_dir: Chemin du répertoire temporaire
+    """
+    # Supprimer la vidéo et les éventuels fichiers partiels ou journaux d'erreur
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+    
+    if _TEMP_DIR_POOL.qsize() < TEMP_DIR_POOL_SIZE:
+        _TEMP_DIR_POOL.put(temp_dir)
+    else:
+        _TEMP_DIRS.discard(temp_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-# Dictionnaire pour stocker les téléchargements en cours
-pending_downloads = {}
+@atexit.register
+def _remove_temp_dirs():
+    """
+    Supprime les répertoires temporaires du pool à l'arrêt du processus
+    """
+    for temp_dir in list(_TEMP_DIRS):
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-# Dictionnaire pour stocker les générations d'images en cours
-pending_images = {}
+# Payloads des postbacks du menu, sérialisés une seule fois au chargement du module
+_MENU_POSTBACKS = {
+    action: json.dumps({"action": action})
+    for action in ("mode_youtube", "mode_mistral", "request_movie", "reset_conversation")
+}
 
-# Dictionnaire pour stocker les recherches IMDb en cours
-imdb_searches = {}
+# Payloads connus déjà décodés : évite json.loads pour les clics sur le menu
+_KNOWN_POSTBACKS = {raw: {"action": action} for action, raw in _MENU_POSTBACKS.items()}
+
+# Menu persistant du bot, sérialisé une seule fois au chargement du module
+PERSISTENT_MENU_PAYLOAD = {
+    "persistent_menu": [
+        {
+            "locale": "default",
+            "composer_input_disabled": False,
+            "call_to_actions": [
+                {
+                    "type": "postback",
+                    "title": "🎬 Mode YouTube",
+                    "payload": _MENU_POSTBACKS["mode_youtube"]
+                },
+                {
+                    "type": "postback",
+                    "title": "🧠 Mode Mistral",
+                    "payload": _MENU_POSTBACKS["mode_mistral"]
+                },
+                {
+                    "type": "postback",
+                    "title": "🎥 Demander un film",
+                    "payload": _MENU_POSTBACKS["request_movie"]
+                },
+                {
+                    "type": "postback",
+                    "title": "🔄 Reset conversation",
+                    "payload": _MENU_POSTBACKS["reset_conversation"]
+                }
+            ]
+        }
+    ]
+}
+
+_MENU_JSON_BYTES = json.dumps(PERSISTENT_MENU_PAYLOAD).encode("utf-8")
 
 def setup_persistent_menu():
     """
@@ -269,134 +614,208 @@ def setup_persistent_menu():
             logger.error("Token d'accès Messenger manquant")
             return None
         
-        url = f"https://graph.facebook.com/v18.0/me/messenger_profile?access_token={MESSENGER_ACCESS_TOKEN}"
+        url = MESSENGER_PROFILE_URL
         
-        # Définir le menu persistant
-        payload = {
-            "persistent_menu": [
-                {
-                    "locale": "default",
-                    "composer_input_disabled": False,
-                    "call_to_actions": [
-                        {
-                            "type": "postback",
-                            "title": "🎬 Mode YouTube",
-                            "payload": json.dumps({"action": "mode_youtube"})
-                        },
-                        {
-                            "type": "postback",
-                            "title": "🧠 Mode Mistral",
-                            "payload": json.dumps({"action": "mode_mistral"})
-                        },
-                        {
-                            "type": "postback",
-                            "title": "🎥 Demander un film",
-                            "payload": json.dumps({"action": "request_movie"})
-                        },
-                        {
-                            "type": "postback",
-                            "title": "🔄 Reset conversation",
-                            "payload": json.dumps({"action": "reset_conversation"})
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        response = requests.post(
+        response = _SESSION.post(
             url,
-            headers={"Content-Type": "application/json"},
-            json=payload
+            headers=JSON_HEADERS,
+            data=_MENU_JSON_BYTES,
+            timeout=GRAPH_TIMEOUT
         )
         
         if response.status_code != 200:
             logger.error(f"Erreur lors de la configuration du menu persistant: {response.status_code} - {response.text}")
             return None
         
-        logger.info(f"Menu persistant configuré avec succès: {response.json()}")
-        return response.json()
+        response_data = json_utils.loads(response.content)
+        logger.info("Menu persistant configuré avec succès: %s", response_data)
+        return response_data
     except Exception as e:
-        logger.error(f"Erreur lors de la configuration du menu persistant: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la configuration du menu persistant: {str(e)}")
         return None
 
+def _cmd_yt(sender_id, match, message_data):
+    """
+    Commande /yt : active le mode YouTube
+    """
+    user_states[sender_id] = 'youtube'
+    send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
+
+def _cmd_mistral(sender_id, match, message_data):
+    """
+    Commande yt/ : réactive le mode Mistral
+    """
+    user_states[sender_id] = 'mistral'
+    send_text_message(sender_id, "Mode Mistral réactivé. Comment puis-je vous aider ?")
+
+def _cmd_reset(sender_id, match, message_data):
+    """
+    Commande /reset : efface l'historique de conversation
+    """
+    clear_user_history(sender_id)
+    send_text_message(sender_id, "Votre historique de conversation a été effacé. Je ne me souviens plus de nos échanges précédents.")
+
+def _cmd_stream(sender_id, match, message_data):
+    """
+    Commande /stream : recherche un film ou une série
+    """
+    handle_stream_command(sender_id, match.group(0).lower())
+
+def _cmd_retry(sender_id, match, message_data):
+    """
+    Commande /retry VIDEO_ID : réessaie le téléchargement d'une vidéo
+    """
+    # L'ID est lu dans le texte d'origine : les IDs YouTube sont sensibles à la casse
+    video_id = match.group('retry').strip()
+    if video_id:
+        logger.info(f"Commande de réessai pour la vidéo: {video_id}")
+        # Supprimer l'entrée de la base de données
+        delete_video_from_db(video_id)
+        # Récupérer les détails de la vidéo
+        video_details = get_video_details(video_id)
+        if video_details:
+            title = video_details.get('title', 'Vidéo YouTube')
+            handle_watch_video(sender_id, video_id, title, force_download=True)
+        else:
+            send_text_message(sender_id, f"Désolé, je n'ai pas pu récupérer les détails de la vidéo {video_id}.")
+    else:
+        send_text_message(sender_id, "Format incorrect. Utilisez /retry VIDEO_ID")
+
+def _cmd_img(sender_id, match, message_data):
+    """
+    Commande /img PROMPT : génère une image avec DALL-E
+    """
+    prompt = match.group('img').strip()  # Extraire le prompt après "/img "
+    if prompt:
+        logger.info(f"Génération d'image pour le prompt: {prompt}")
+        send_text_message(sender_id, f"Génération de l'image en cours pour: {prompt}. Cela peut prendre quelques instants...")
+        
+        # Vérifier si une génération est déjà en cours et la marquer comme en cours en une seule opération
+        with _shard(sender_id):
+            already_pending = pending_images.get(sender_id)
+            if not already_pending:
+                pending_images[sender_id] = True
+        
+        if already_pending:
+            send_text_message(sender_id, "Une génération d'image est déjà en cours. Veuillez patienter.")
+            return
+        
+        # Créer une fonction de callback pour la génération d'image
+        def image_callback(result):
+            _CALLBACK_POOL.submit(handle_image_callback, sender_id, prompt, result)
+        
+        # Ajouter la génération à la file d'attente
+        generate_and_upload_image(prompt, image_callback)
+    else:
+        send_text_message(sender_id, "Veuillez fournir une description pour l'image. Exemple: /img un chat jouant du piano")
+
+# Commandes reconnues, en une seule expression compilée (un groupe nommé par commande)
+# \Z plutôt que $ : « /yt\n » n'est pas la commande /yt
+_COMMAND_RE = re.compile(
+    r"^(?:(?P<yt>/yt)|(?P<mistral>yt/)|(?P<reset>/reset)"
+    r"|(?P<stream>/stream(?: .*)?)"
+    r"|/retry (?P<retry>[^ ]*).*"
+    r"|/img (?P<img>.*))\Z",
+    re.IGNORECASE | re.DOTALL
+)
+
+# Fonction associée à chaque groupe de _COMMAND_RE
+_COMMAND_HANDLERS = {
+    'yt': _cmd_yt,
+    'mistral': _cmd_mistral,
+    'reset': _cmd_reset,
+    'stream': _cmd_stream,
+    'retry': _cmd_retry,
+    'img': _cmd_img
+}
+
+def _postback_watch_video(sender_id, payload):
+    """
+    Postback watch_video : télécharge la vidéo sélectionnée
+    """
+    logger.info(f"Action watch_video détectée pour videoId: {payload.get('videoId')}")
+    handle_watch_video(sender_id, payload.get('videoId'), payload.get('title', 'Vidéo YouTube'))
+
+def _postback_mode_youtube(sender_id, payload):
+    """
+    Postback mode_youtube / activate_youtube : active le mode YouTube
+    """
+    user_states[sender_id] = 'youtube'
+    send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
+
+def _postback_mode_mistral(sender_id, payload):
+    """
+    Postback mode_mistral / activate_mistral : active le mode Mistral
+    """
+    user_states[sender_id] = 'mistral'
+    send_text_message(sender_id, "Mode Mistral activé. Comment puis-je vous aider ?")
+
+def _postback_generate_image(sender_id, payload):
+    """
+    Postback generate_image : explique la commande /img
+    """
+    send_text_message(sender_id, "Pour générer une image, envoyez une commande comme: /img un chat jouant du piano")
+
+def _postback_request_movie(sender_id, payload):
+    """
+    Postback request_movie : demande un film ou une série
+    """
+    handle_stream_command(sender_id, "/stream")
+
+def _postback_select_imdb(sender_id, payload):
+    """
+    Postback select_imdb : sélectionne un résultat IMDb
+    """
+    handle_imdb_selection(sender_id, payload.get('imdb_id'), payload.get('title'), payload.get('type'))
+
+def _postback_reset_conversation(sender_id, payload):
+    """
+    Postback reset_conversation : efface l'historique de conversation
+    """
+    clear_user_history(sender_id)
+    send_text_message(sender_id, "Votre historique de conversation a été effacé. Je ne me souviens plus de nos échanges précédents.")
+
+# Actions de postback reconnues
+_POSTBACK_HANDLERS = {
+    'watch_video': _postback_watch_video,
+    'activate_youtube': _postback_mode_youtube,
+    'mode_youtube': _postback_mode_youtube,
+    'activate_mistral': _postback_mode_mistral,
+    'mode_mistral': _postback_mode_mistral,
+    'generate_image': _postback_generate_image,
+    'request_movie': _postback_request_movie,
+    'select_imdb': _postback_select_imdb,
+    'reset_conversation': _postback_reset_conversation
+}
+
 def handle_message(sender_id, message_data):
     """
     Gère les messages reçus des utilisateurs
     """
     logger.info(f"Début de handle_message pour sender_id: {sender_id}")
-    logger.info(f"Message reçu: {json.dumps(message_data)}")
+    logger.info("Message reçu: %s", lazy_json(message_data))
     
     try:
         if 'text' in message_data:
-            text = message_data['text'].lower()
-            
             # Vérifier si l'utilisateur est en mode recherche IMDb
-            if sender_id in user_states and user_states[sender_id] == 'imdb_search':
+            user_state = user_states.get(sender_id)
+            if user_state == 'imdb_search':
                 # L'utilisateur a envoyé un titre de film ou série
                 handle_imdb_search(sender_id, message_data['text'])
                 return
             
-            if text == '/yt':
-                user_states[sender_id] = 'youtube'
-                send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
-            elif text == 'yt/':
-                user_states[sender_id] = 'mistral'
-                send_text_message(sender_id, "Mode Mistral réactivé. Comment puis-je vous aider ?")
-            elif text == '/reset':
-                # Commande pour effacer l'historique de conversation
-                clear_user_history(sender_id)
-                send_text_message(sender_id, "Votre historique de conversation a été effacé. Je ne me souviens plus de nos échanges précédents.")
-            elif text == '/stream' or text.startswith('/stream '):
-                # Commande pour rechercher un film ou une série
-                handle_stream_command(sender_id, text)
-            elif text.startswith('/retry '):
-                # Commande pour réessayer le téléchargement d'une vidéo
-                video_id = text.split(' ')[1].strip()
-                if video_id:
-                    logger.info(f"Commande de réessai pour la vidéo: {video_id}")
-                    # Supprimer l'entrée de la base de données
-                    delete_video_from_db(video_id)
-                    # Récupérer les détails de la vidéo
-                    from src.youtube_api import get_video_details
-                    video_details = get_video_details(video_id)
-                    if video_details:
-                        title = video_details.get('title', 'Vidéo YouTube')
-                        handle_watch_video(sender_id, video_id, title, force_download=True)
-                    else:
-                        send_text_message(sender_id, f"Désolé, je n'ai pas pu récupérer les détails de la vidéo {video_id}.")
-                else:
-                    send_text_message(sender_id, "Format incorrect. Utilisez /retry VIDEO_ID")
-            elif text.startswith('/img '):
-                # Commande pour générer une image avec DALL-E
-                prompt = message_data['text'][5:].strip()  # Extraire le prompt après "/img "
-                if prompt:
-                    logger.info(f"Génération d'image pour le prompt: {prompt}")
-                    send_text_message(sender_id, f"Génération de l'image en cours pour: {prompt}. Cela peut prendre quelques instants...")
-                    
-                    # Vérifier si une génération est déjà en cours pour cet utilisateur
-                    if sender_id in pending_images and pending_images[sender_id]:
-                        send_text_message(sender_id, "Une génération d'image est déjà en cours. Veuillez patienter.")
-                        return
-                    
-                    # Marquer la génération comme en cours
-                    if sender_id not in pending_images:
-                        pending_images[sender_id] = {}
-                    pending_images[sender_id] = True
-                    
-                    # Créer une fonction de callback pour la génération d'image
-                    def image_callback(result):
-                        handle_image_callback(sender_id, prompt, result)
-                    
-                    # Ajouter la génération à la file d'attente
-                    generate_and_upload_image(prompt, image_callback)
-                else:
-                    send_text_message(sender_id, "Veuillez fournir une description pour l'image. Exemple: /img un chat jouant du piano")
-            elif sender_id in user_states and user_states[sender_id] == 'youtube':
+            # Reconnaître la commande en un seul passage (sans mettre tout le message en minuscules)
+            match = _COMMAND_RE.match(message_data['text'])
+            
+            if match is not None:
+                _COMMAND_HANDLERS[match.lastgroup](sender_id, match, message_data)
+            elif user_state == 'youtube':
                 logger.info(f"Recherche YouTube pour: {message_data['text']}")
+                # Afficher l'indicateur de saisie pendant la recherche, sans l'attendre
+                _IO_POOL.submit(send_sender_action, sender_id, "typing_on")
                 try:
                     videos = search_youtube(message_data['text'])
-                    logger.info(f"Résultats de la recherche YouTube: {json.dumps(videos)}")
+                    logger.info("Résultats de la recherche YouTube: %s", lazy_json(videos))
                     send_youtube_results(sender_id, videos)
                 except Exception as e:
                     logger.error(f"Erreur lors de la recherche YouTube: {str(e)}")
@@ -410,33 +829,21 @@ def handle_message(sender_id, message_data):
             
             logger.info("Message envoyé avec succès")
         elif 'postback' in message_data:
-            logger.info(f"Traitement du postback: {json.dumps(message_data['postback'])}")
+            logger.info("Traitement du postback: %s", lazy_json(message_data['postback']))
             try:
-                payload = json.loads(message_data['postback']['payload'])
-                logger.info(f"Payload du postback: {json.dumps(payload)}")
+                raw_payload = message_data['postback']['payload']
+                payload = _KNOWN_POSTBACKS.get(raw_payload)
+                if payload is None:
+                    payload = json_utils.loads(raw_payload)
+                logger.info(f"Payload du postback: {raw_payload}")
                 
-                if payload.get('action') == 'watch_video':
-                    logger.info(f"Action watch_video détectée pour videoId: {payload.get('videoId')}")
-                    handle_watch_video(sender_id, payload.get('videoId'), payload.get('title', 'Vidéo YouTube'))
-                elif payload.get('action') == 'activate_youtube' or payload.get('action') == 'mode_youtube':
-                    user_states[sender_id] = 'youtube'
-                    send_text_message(sender_id, "Mode YouTube activé. Donnez-moi les mots-clés pour la recherche YouTube.")
-                elif payload.get('action') == 'activate_mistral' or payload.get('action') == 'mode_mistral':
-                    user_states[sender_id] = 'mistral'
-                    send_text_message(sender_id, "Mode Mistral activé. Comment puis-je vous aider ?")
-                elif payload.get('action') == 'generate_image':
-                    send_text_message(sender_id, "Pour générer une image, envoyez une commande comme: /img un chat jouant du piano")
-                elif payload.get('action') == 'request_movie':
-                    # Action pour demander un film ou une série
-                    handle_stream_command(sender_id, "/stream")
-                elif payload.get('action') == 'select_imdb':
-                    # Action pour sélectionner un résultat IMDb
-                    handle_imdb_selection(sender_id, payload.get('imdb_id'), payload.get('title'), payload.get('type'))
-                elif payload.get('action') == 'reset_conversation':
-                    clear_user_history(sender_id)
-                    send_text_message(sender_id, "Votre historique de conversation a été effacé. Je ne me souviens plus de nos échanges précédents.")
+                action = payload.get('action')
+                handler = _POSTBACK_HANDLERS.get(action)
+                
+                if handler is not None:
+                    handler(sender_id, payload)
                 else:
-                    logger.info(f"Action de postback non reconnue: {payload.get('action')}")
+                    logger.info(f"Action de postback non reconnue: {action}")
             except Exception as e:
                 logger.error(f"Erreur lors du traitement du postback: {str(e)}")
                 send_text_message(sender_id, "Désolé, je n'ai pas pu traiter votre demande. Veuillez réessayer plus tard.")
@@ -444,10 +851,9 @@ def handle_message(sender_id, message_data):
             logger.info("Message reçu sans texte")
             send_text_message(sender_id, "Désolé, je ne peux traiter que des messages texte.")
     except Exception as e:
-        logger.error(f"Erreur lors du traitement du message: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erreur lors du traitement du message: {str(e)}")
         error_message = "Désolé, j'ai rencontré une erreur en traitant votre message. Veuillez réessayer plus tard."
-        if "timeout" in str(e):
+        if isinstance(e, (TimeoutError, requests.Timeout)) or "timeout" in str(e):
             error_message = "Désolé, la génération de la réponse a pris trop de temps. Veuillez réessayer avec une question plus courte ou plus simple."
         send_text_message(sender_id, error_message)
     
@@ -477,10 +883,47 @@ def handle_stream_command(sender_id, text):
             user_states[sender_id] = 'imdb_search'
             send_text_message(sender_id, "Quel est le titre du film ou de la série que tu veux voir ?")
     except Exception as e:
-        logger.error(f"Erreur lors du traitement de la commande stream: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors du traitement de la commande stream: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu traiter votre demande. Veuillez réessayer plus tard.")
 
+# Nombre maximum d'éléments dans un carrousel (template generic) Messenger
+CAROUSEL_MAX_ELEMENTS = 10
+
+def _build_imdb_card(result):
+    """
+    Construit l'élément de carrousel d'un résultat IMDb
+    
+    Args:
+        result: Résultat de la recherche IMDb
+        
+    Returns:
+        Élément du carrousel avec l'image et le bouton de sélection
+    """
+    title = result.get('title', 'Titre inconnu')
+    if result.get('year'):
+        title += f" ({result.get('year')})"
+    
+    # Déterminer le texte du bouton en fonction du type
+    button_text = "Ce film 🎬" if result.get('type') == "film" else "Cette série 📺"
+    
+    return {
+        "title": title,
+        "image_url": result.get('image_url') or DEFAULT_IMAGE_URL,
+        "subtitle": result.get('stars', ''),
+        "buttons": [
+            {
+                "type": "postback",
+                "title": button_text,
+                "payload": json_utils.dumps({
+                    "action": "select_imdb",
+                    "imdb_id": result.get('imdb_id', ''),
+                    "title": result.get('title', ''),
+                    "type": result.get('type', '')
+                }).decode("utf-8")
+            }
+        ]
+    }
+
 def handle_imdb_search(sender_id, query):
     """
     Gère la recherche IMDb
@@ -505,78 +948,34 @@ def handle_imdb_search(sender_id, query):
         # Stocker les résultats pour cet utilisateur
         imdb_searches[sender_id] = results
         
-        # Envoyer un message de confirmation
-        send_text_message(sender_id, f"J'ai trouvé {len(results)} résultats pour '{query}'. Voici les meilleurs résultats :")
-        
-        # Envoyer les résultats un par un
-        for result in results:
-            # Créer le message avec l'image et le bouton
-            title = result.get('title', 'Titre inconnu')
-            if result.get('year'):
-                title += f" ({result.get('year')})"
-            
-            # Déterminer le texte du bouton en fonction du type
-            button_text = "Ce film 🎬" if result.get('type') == "film" else "Cette série 📺"
-            
-            # S'assurer que l'URL de l'image est valide
-            image_url = result.get('image_url', '')
-            if not image_url:
-                image_url = "https://m.media-amazon.com/images/M/MV5BMTg1MTY2MjYzNV5BMl5BanBnXkFtZTgwMTc4NTMwNDI@._V1_UX182_CR0,0,182,268_AL_.jpg"
-            
-            # Journaliser l'URL de l'image pour le débogage
-            logger.info(f"Envoi d'un résultat IMDb avec l'image: {image_url}")
-            
-            # Créer le message avec l'image et le bouton
+        # Message de confirmation, envoyé dans le même lot que les résultats
+        messages = [{"text": f"J'ai trouvé {len(results)} résultats pour '{query}'. Voici les meilleurs résultats :"}]
+        
+        # Regrouper les résultats en carrousels (10 éléments au maximum par carrousel)
+        elements = [_build_imdb_card(result) for result in results]
+        for i in range(0, len(elements), CAROUSEL_MAX_ELEMENTS):
             message = {
                 "attachment": {
                     "type": "template",
                     "payload": {
                         "template_type": "generic",
-                        "elements": [
-                            {
-                                "title": title,
-                                "image_url": image_url,
-                                "subtitle": result.get('stars', ''),
-                                "buttons": [
-                                    {
-                                        "type": "postback",
-                                        "title": button_text,
-                                        "payload": json.dumps({
-                                            "action": "select_imdb",
-                                            "imdb_id": result.get('imdb_id', ''),
-                                            "title": result.get('title', ''),
-                                            "type": result.get('type', '')
-                                        })
-                                    }
-                                ]
-                            }
-                        ]
+                        "elements": elements[i:i + CAROUSEL_MAX_ELEMENTS]
                     }
                 }
             }
             
             # Journaliser le message complet pour le débogage
-            logger.info(f"Message IMDb complet: {json.dumps(message)}")
+            logger.info("Message IMDb complet: %s", lazy_json(message))
             
-            # Envoyer le message
-            payload = {
-                "recipient": {"id": sender_id},
-                "message": message
-            }
-            
-            response = requests.post(
-                f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}",
-                headers={"Content-Type": "application/json"},
-                json=payload
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Erreur lors de l'envoi du résultat IMDb: {response.status_code} - {response.text}")
-            else:
-                logger.info(f"Résultat IMDb envoyé avec succès: {response.json()}")
+            messages.append(message)
+        
+        # Envoyer la confirmation et tous les résultats en une seule requête
+        if send_batch(sender_id, messages) is None:
+            logger.error("Erreur lors de l'envoi des résultats IMDb")
+        else:
+            logger.info("Résultats IMDb envoyés avec succès")
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche IMDb: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la recherche IMDb: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu effectuer la recherche. Veuillez réessayer plus tard.")
 
 def handle_imdb_selection(sender_id, imdb_id, title, item_type):
@@ -610,7 +1009,9 @@ def handle_imdb_selection(sender_id, imdb_id, title, item_type):
             send_text_message(sender_id, "Désolé, je n'ai pas pu récupérer les détails de votre sélection. Veuillez réessayer plus tard.")
             return
         
-        # Ajouter la demande à Google Sheets
+        # Ajouter la demande à Google Sheets (importé ici : gspread et oauth2client ne sont
+        # chargés que par les workers qui reçoivent effectivement une demande de film)
+        from src.google_sheets_api import add_imdb_request_to_sheet
         user_name = "Utilisateur"  # Idéalement, récupérer le nom de l'utilisateur via l'API Messenger
         success = add_imdb_request_to_sheet(sender_id, user_name, imdb_data)
         
@@ -620,8 +1021,7 @@ def handle_imdb_selection(sender_id, imdb_id, title, item_type):
         else:
             send_text_message(sender_id, f"✅ Merci ! Ta demande pour '{title}' a bien été reçue, mais je n'ai pas pu l'enregistrer dans la base de données. L'équipe sera informée manuellement.")
     except Exception as e:
-        logger.error(f"Erreur lors de la sélection IMDb: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la sélection IMDb: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu traiter votre sélection. Veuillez réessayer plus tard.")
 
 def handle_image_callback(sender_id, prompt, result):
@@ -637,42 +1037,44 @@ def handle_image_callback(sender_id, prompt, result):
     
     try:
         # Supprimer la génération en cours
-        if sender_id in pending_images:
-            pending_images[sender_id] = False
+        with _shard(sender_id):
+            if sender_id in pending_images:
+                pending_images[sender_id] = False
         
         # Si le résultat est None, envoyer un message d'erreur
         if result is None:
             send_text_message(sender_id, "Désolé, je n'ai pas pu générer l'image. Veuillez réessayer plus tard.")
             return
         
-        # Si le résultat est un chemin de fichier, vérifier qu'il existe
-        if not os.path.exists(result):
+        # Si le résultat est un chemin de fichier, vérifier qu'il existe (un seul stat pour tout le callback)
+        try:
+            file_size = os.stat(result).st_size
+        except FileNotFoundError:
             send_text_message(sender_id, "Désolé, je n'ai pas pu générer l'image. Veuillez réessayer plus tard.")
             return
         
         logger.info(f"Image générée avec succès: {result}")
         
-        # Essayer d'envoyer directement le fichier
-        try:
-            logger.info(f"Tentative d'envoi direct du fichier: {result}")
-            send_text_message(sender_id, "Voici l'image générée:")
-            send_file_attachment(sender_id, result, "image")
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi direct du fichier: {str(e)}")
-            logger.error(traceback.format_exc())
+        # Envoyer le message d'annonce avant l'image : Messenger ne garantit pas l'ordre
+        # de remise de deux envois simultanés (send_file_attachment réessaie déjà les erreurs transitoires)
+        send_text_message(sender_id, "Voici l'image générée:")
+        logger.info(f"Tentative d'envoi direct du fichier: {result}")
+        
+        if not send_file_attachment(sender_id, result, "image"):
+            logger.error(f"Échec de l'envoi direct du fichier: {result}")
             
             # Si l'envoi direct échoue, essayer Cloudinary
             try:
                 logger.info(f"Tentative de téléchargement sur Cloudinary: {result}")
                 
-                # Vérifier que le fichier existe et a une taille non nulle
-                if not os.path.exists(result) or os.path.getsize(result) == 0:
-                    logger.error(f"Fichier invalide pour Cloudinary: {result}, taille: {os.path.getsize(result) if os.path.exists(result) else 'N/A'}")
+                # Vérifier que le fichier a une taille non nulle
+                if file_size == 0:
+                    logger.error(f"Fichier invalide pour Cloudinary: {result}, taille: {file_size}")
                     raise Exception(f"Fichier invalide pour Cloudinary: {result}")
                 
-                # Télécharger sur Cloudinary
-                image_id = f"dalle_{int(time.time())}"
-                cloudinary_result = upload_file(result, image_id, "image")
+                # Télécharger sur Cloudinary (réutilise l'envoi déjà fait par la génération si le contenu est identique)
+                image_id = new_image_id()
+                cloudinary_result = upload_file_cached(result, image_id, "image")
                 
                 if not cloudinary_result or not cloudinary_result.get('secure_url'):
                     logger.error("Échec du téléchargement sur Cloudinary")
@@ -681,27 +1083,19 @@ def handle_image_callback(sender_id, prompt, result):
                 image_url = cloudinary_result.get('secure_url')
                 logger.info(f"Image téléchargée sur Cloudinary: {image_url}")
                 
-                # Envoyer l'image à l'utilisateur
-                send_text_message(sender_id, "Voici l'image générée:")
+                # Envoyer l'image à l'utilisateur (le message d'annonce a déjà été envoyé)
                 send_image_message(sender_id, image_url)
             except Exception as e:
-                logger.error(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
                 
                 # Envoyer un message d'erreur
                 send_text_message(sender_id, "Désolé, je n'ai pas pu envoyer l'image générée. Veuillez réessayer plus tard.")
         
-        # Nettoyer le répertoire temporaire
-        try:
-            if os.path.exists(result):
-                os.remove(result)
-                logger.info(f"Fichier temporaire nettoyé : {result}")
-        except Exception as e:
-            logger.error(f"Erreur lors du nettoyage du fichier temporaire: {str(e)}")
+        # Nettoyer le fichier temporaire en arrière-plan
+        _CLEANUP_QUEUE.put(result)
             
     except Exception as e:
-        logger.error(f"Erreur dans le callback de génération d'image: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur dans le callback de génération d'image: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu traiter l'image générée. Veuillez réessayer plus tard.")
 
 def handle_watch_video(sender_id, video_id, title, force_download=False):
@@ -714,44 +1108,69 @@ def handle_watch_video(sender_id, video_id, title, force_download=False):
         title: Titre de la vidéo
         force_download: Force le téléchargement même si la vidéo existe déjà
     """
+    temp_dir = None
     try:
         logger.info(f"Demande de téléchargement de la vidéo {video_id} par {sender_id}")
         
-        # Vérifier si l'ID est valide
-        if not video_id:
+        # Vérifier si l'ID est valide avant de réserver un répertoire temporaire
+        if not video_id or not _VIDEO_ID_RE.match(video_id):
             send_text_message(sender_id, "Désolé, l'ID de la vidéo est invalide.")
             return
         
         # Informer l'utilisateur que le téléchargement est en cours
         send_text_message(sender_id, f"Je télécharge la vidéo '{title}'. Cela peut prendre quelques instants...")
         
-        # Créer un répertoire temporaire pour la vidéo
-        temp_dir = tempfile.mkdtemp()
-        output_path = os.path.join(temp_dir, f"{video_id}.mp4")
+        # Vérifier si un téléchargement est déjà en cours et le marquer comme en cours en une seule opération
+        with _shard(sender_id):
+            already_pending = pending_downloads.get(sender_id)
+            if not already_pending:
+                # Réserver un répertoire temporaire pour la vidéo (rendu au pool par le callback)
+                # et le conserver pour marquer le téléchargement comme en cours
+                temp_dir = _acquire_temp_dir()
+                pending_downloads[sender_id] = temp_dir
         
-        # Vérifier si un téléchargement est déjà en cours pour cet utilisateur
-        if sender_id in pending_downloads and pending_downloads[sender_id]:
+        if already_pending:
             send_text_message(sender_id, "Un téléchargement est déjà en cours. Veuillez patienter.")
             return
         
-        # Marquer le téléchargement comme en cours
-        if sender_id not in pending_downloads:
-            pending_downloads[sender_id] = {}
-        pending_downloads[sender_id] = True
+        output_path = os.path.join(temp_dir, f"{video_id}.mp4")
         
         # Créer une fonction de callback pour le téléchargement
         def download_callback(result):
-            handle_download_callback(sender_id, video_id, title, result)
+            handle_download_callback(sender_id, video_id, title, result, temp_dir)
         
         # Ajouter le téléchargement à la file d'attente
         download_youtube_video(video_id, output_path, download_callback)
         
     except Exception as e:
-        logger.error(f"Erreur lors de la gestion de la demande de téléchargement: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la gestion de la demande de téléchargement: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu télécharger la vidéo. Veuillez réessayer plus tard.")
+        
+        # Le callback ne sera pas appelé : lever l'indicateur de téléchargement en cours
+        # et rendre le répertoire temporaire réservé au pool
+        if temp_dir is not None:
+            with _shard(sender_id):
+                if pending_downloads.get(sender_id) == temp_dir:
+                    pending_downloads[sender_id] = False
+            _release_temp_dir(temp_dir)
+
+def _discard_speculative_upload(upload_future):
+    """
+    Supprime de Cloudinary une vidéo téléchargée par anticipation devenue inutile
+    
+    Args:
+        upload_future: Future du téléchargement sur Cloudinary
+    """
+    try:
+        cloudinary_result = upload_future.result()
+        if cloudinary_result and cloudinary_result.get('public_id'):
+            public_id = cloudinary_result.get('public_id')
+            delete_result = delete_file(public_id, cloudinary_result.get('resource_type', 'video'))
+            logger.info(f"Copie Cloudinary inutilisée supprimée: {public_id}, résultat: {delete_result}")
+    except Exception as e:
+        logger.error(f"Erreur lors de la suppression de la copie Cloudinary inutilisée: {str(e)}")
 
-def handle_download_callback(sender_id, video_id, title, result):
+def handle_download_callback(sender_id, video_id, title, result, temp_dir=None):
     """
     Callback pour le téléchargement d'une vidéo
     
@@ -760,13 +1179,18 @@ def handle_download_callback(sender_id, video_id, title, result):
         video_id: ID de la vidéo YouTube
         title: Titre de la vidéo
         result: Résultat du téléchargement (chemin du fichier ou URL)
+        temp_dir: Répertoire temporaire du téléchargement (lu dans pending_downloads s'il n'est pas fourni)
     """
-    try:
-        logger.info(f"Callback de téléchargement pour {sender_id}, vidéo: {video_id}")
-        
-        # Supprimer le téléchargement en cours
+    # Récupérer le répertoire temporaire associé au téléchargement et supprimer le téléchargement en cours
+    with _shard(sender_id):
+        if temp_dir is None:
+            temp_dir = pending_downloads.get(sender_id)
         if sender_id in pending_downloads:
             pending_downloads[sender_id] = False
+    
+    upload_future = None
+    try:
+        logger.info(f"Callback de téléchargement pour {sender_id}, vidéo: {video_id}")
         
         # Si le résultat est None, envoyer un message d'erreur
         if result is None:
@@ -774,38 +1198,52 @@ def handle_download_callback(sender_id, video_id, title, result):
             return
         
         # Si le résultat est une URL YouTube, c'est que le téléchargement a échoué
-        if result.startswith("https://www.youtube.com/watch"):
+        if result.startswith(YOUTUBE_WATCH_URL):
             send_text_message(sender_id, f"Désolé, je n'ai pas pu télécharger la vidéo. Vous pouvez la regarder directement sur YouTube: {result}")
             return
         
-        # Si le résultat est un chemin de fichier, vérifier qu'il existe
-        if not os.path.exists(result):
+        # Si le résultat est un chemin de fichier, vérifier qu'il existe et récupérer sa taille en un seul stat
+        try:
+            file_size = os.stat(result).st_size
+        except FileNotFoundError:
             send_text_message(sender_id, "Désolé, je n'ai pas pu télécharger la vidéo. Veuillez réessayer plus tard.")
             return
         
         logger.info(f"Vidéo téléchargée avec succès: {result}")
         
-        # Essayer d'envoyer directement le fichier
-        try:
-            logger.info(f"Tentative d'envoi direct du fichier: {result}")
-            send_text_message(sender_id, f"Voici la vidéo '{title}':")
-            send_file_attachment(sender_id, result, "video")
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi direct du fichier: {str(e)}")
-            logger.error(traceback.format_exc())
+        # Pour une vidéo volumineuse, commencer dès maintenant le téléchargement sur Cloudinary
+        # (solution de repli) au lieu d'attendre l'échec probable de l'envoi direct
+        video_id_cloudinary = f"youtube_{video_id}_{int(time.time())}"
+        if file_size >= SPECULATIVE_UPLOAD_MIN_SIZE:
+            upload_future = _UPLOAD_POOL.submit(upload_file, result, video_id_cloudinary, "video")
+        
+        # Annoncer la vidéo une seule fois, quel que soit le mode d'envoi retenu, avant d'envoyer
+        # le fichier : Messenger ne garantit pas l'ordre de remise de deux envois simultanés
+        send_text_message(sender_id, f"Voici la vidéo '{title}':")
+        logger.info(f"Tentative d'envoi direct du fichier: {result}")
+        
+        if send_file_attachment(sender_id, result, "video"):
+            # L'envoi direct a réussi : la copie Cloudinary est inutile (annulée si elle n'a pas
+            # commencé, sinon supprimée une fois terminée)
+            if upload_future is not None and not upload_future.cancel():
+                upload_future.add_done_callback(_discard_speculative_upload)
+        else:
+            logger.warning(f"Échec de l'envoi direct du fichier: {result}")
             
             # Si l'envoi direct échoue, essayer Cloudinary
             try:
                 logger.info(f"Tentative de téléchargement sur Cloudinary: {result}")
                 
-                # Vérifier que le fichier existe et a une taille non nulle
-                if not os.path.exists(result) or os.path.getsize(result) == 0:
-                    logger.error(f"Fichier invalide pour Cloudinary: {result}, taille: {os.path.getsize(result) if os.path.exists(result) else 'N/A'}")
+                # Vérifier que le fichier a une taille non nulle
+                if file_size == 0:
+                    logger.error(f"Fichier invalide pour Cloudinary: {result}, taille: {file_size}")
                     raise Exception(f"Fichier invalide pour Cloudinary: {result}")
                 
-                # Télécharger sur Cloudinary
-                video_id_cloudinary = f"youtube_{video_id}_{int(time.time())}"
-                cloudinary_result = upload_file(result, video_id_cloudinary, "video")
+                # Récupérer le téléchargement sur Cloudinary lancé en parallèle, ou le faire maintenant
+                if upload_future is not None:
+                    cloudinary_result = upload_future.result()
+                else:
+                    cloudinary_result = upload_file(result, video_id_cloudinary, "video")
                 
                 if not cloudinary_result or not cloudinary_result.get('secure_url'):
                     logger.error("Échec du téléchargement sur Cloudinary")
@@ -818,7 +1256,7 @@ def handle_download_callback(sender_id, video_id, title, result):
                 # Si l'URL est de type "raw", envoyer le lien YouTube
                 if is_raw_url:
                     logger.warning(f"URL Cloudinary de type 'raw' détectée: {video_url}")
-                    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+                    youtube_url = YOUTUBE_WATCH_URL + video_id
                     send_text_message(sender_id, f"Désolé, je n'ai pas pu traiter la vidéo. Vous pouvez la regarder directement sur YouTube: {youtube_url}")
                     
                     if public_id:
@@ -831,13 +1269,11 @@ def handle_download_callback(sender_id, video_id, title, result):
                     logger.info(f"Vidéo téléchargée sur Cloudinary: {video_url}")
                     
                     # Envoyer la vidéo à l'utilisateur
-                    send_text_message(sender_id, f"Voici la vidéo '{title}':")
                     video_send_result = send_video_message(sender_id, video_url)
                     
                     if video_send_result and public_id:
                         try:
                             # Wait a moment to ensure the video was delivered
-                            import threading
                             def delayed_delete():
                                 time.sleep(10)  # Wait 10 seconds before deletion
                                 delete_result = delete_file(public_id, "video")
@@ -860,31 +1296,23 @@ def handle_download_callback(sender_id, video_id, title, result):
                 except Exception as db_error:
                     logger.error(f"Erreur lors de la sauvegarde dans la base de données: {str(db_error)}")
             except Exception as e:
-                logger.error(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Erreur lors du téléchargement sur Cloudinary: {str(e)}")
                 
                 # Envoyer un message d'erreur
                 send_text_message(sender_id, "Désolé, je n'ai pas pu envoyer la vidéo. Vous pouvez la regarder directement sur YouTube: " + 
-                               f"https://www.youtube.com/watch?v={video_id}")
-        
-        # Nettoyer le répertoire temporaire
-        try:
-            if os.path.exists(result):
-                os.remove(result)
-                logger.info(f"Fichier temporaire nettoyé : {result}")
-            
-            # Supprimer le répertoire parent si c'est un répertoire temporaire
-            parent_dir = os.path.dirname(result)
-            if os.path.exists(parent_dir) and tempfile.gettempdir() in parent_dir:
-                shutil.rmtree(parent_dir, ignore_errors=True)
-                logger.info(f"Répertoire temporaire nettoyé : {parent_dir}")
-        except Exception as e:
-            logger.error(f"Erreur lors du nettoyage du fichier temporaire: {str(e)}")
+                               YOUTUBE_WATCH_URL + video_id)
             
     except Exception as e:
-        logger.error(f"Erreur dans le callback de téléchargement: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur dans le callback de téléchargement: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu traiter la vidéo téléchargée. Veuillez réessayer plus tard.")
+    finally:
+        # Vider le répertoire temporaire en arrière-plan et le rendre au pool, quel que soit le chemin de sortie,
+        # une fois le téléchargement sur Cloudinary terminé (il lit encore la vidéo)
+        if isinstance(temp_dir, str):
+            if upload_future is not None:
+                upload_future.add_done_callback(lambda _: _CLEANUP_QUEUE.put(temp_dir))
+            else:
+                _CLEANUP_QUEUE.put(temp_dir)
 
 def delete_video_from_db(video_id):
     """
@@ -899,10 +1327,62 @@ def delete_video_from_db(video_id):
         # si nécessaire
         return True
     except Exception as e:
-        logger.error(f"Erreur lors de la suppression de la vidéo de la base de données: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la suppression de la vidéo de la base de données: {str(e)}")
         return False
 
+def _truncate(text, limit=80):
+    """
+    Tronque un texte à la limite de caractères de Messenger
+    
+    Args:
+        text: Texte à tronquer
+        limit: Nombre maximum de caractères
+        
+    Returns:
+        Texte tronqué, terminé par '...' s'il dépassait la limite
+    """
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+# Modèle JSON du payload watch_video (seuls l'ID et le titre, déjà encodés en JSON, varient)
+_WATCH_PAYLOAD_TEMPLATE = '{{"action": "watch_video", "videoId": {vid}, "title": {title}}}'
+
+def _build_youtube_card(video):
+    """
+    Construit l'élément de carrousel d'une vidéo YouTube
+    
+    Args:
+        video: Vidéo trouvée (avec un videoId valide)
+        
+    Returns:
+        Élément du carrousel avec les boutons de téléchargement et de lecture
+    """
+    vid = video['videoId']
+    
+    # Limiter la longueur du titre et de la description à 80 caractères (limite de Messenger)
+    title = _truncate(video.get('title') or 'Vidéo YouTube')
+    
+    return {
+        "title": title,
+        "image_url": video.get('thumbnail') or f"https://img.youtube.com/vi/{vid}/hqdefault.jpg",
+        "subtitle": _truncate(video.get('description') or ''),
+        "buttons": [
+            {
+                "type": "postback",
+                "title": "Télécharger",
+                # Payload du bouton de téléchargement, rempli à partir d'un modèle pré-sérialisé
+                "payload": _WATCH_PAYLOAD_TEMPLATE.format(
+                    vid=json_utils.dumps(vid).decode("utf-8"),
+                    title=json_utils.dumps(title).decode("utf-8")
+                )
+            },
+            {
+                "type": "web_url",
+                "title": "Voir sur YouTube",
+                "url": YOUTUBE_WATCH_URL + vid
+            }
+        ]
+    }
+
 def send_youtube_results(sender_id, videos):
     """
     Envoie les résultats de recherche YouTube à l'utilisateur
@@ -914,52 +1394,16 @@ def send_youtube_results(sender_id, videos):
     try:
         logger.info(f"Envoi des résultats YouTube à {sender_id}")
         
-        # Limiter le nombre de vidéos à 10 (limite du carrousel Messenger)
-        videos = videos[:10]
+        # Écarter les vidéos sans ID valide (un élément invalide fait échouer tout le carrousel)
+        # et limiter le nombre de vidéos à la taille maximale d'un carrousel Messenger
+        videos = [video for video in videos if _VIDEO_ID_RE.match(video.get('videoId') or '')][:CAROUSEL_MAX_ELEMENTS]
         
         if not videos:
             send_text_message(sender_id, "Désolé, je n'ai pas trouvé de vidéos correspondant à votre recherche.")
             return
         
-        # Envoyer un message de confirmation
-        send_text_message(sender_id, f"J'ai trouvé {len(videos)} vidéos. Voici les résultats:")
-        
         # Créer les éléments du carrousel
-        elements = []
-        for video in videos:
-            # Limiter la longueur du titre à 80 caractères (limite de Messenger)
-            title = video.get('title', 'Vidéo YouTube')
-            if len(title) > 80:
-                title = title[:77] + '...'
-            
-            # Limiter la longueur de la description à 80 caractères
-            description = video.get('description', '')
-            if len(description) > 80:
-                description = description[:77] + '...'
-            
-            # Créer l'élément du carrousel
-            element = {
-                "title": title,
-                "image_url": video.get('thumbnail', ''),
-                "subtitle": description,
-                "buttons": [
-                    {
-                        "type": "postback",
-                        "title": "Télécharger",
-                        "payload": json.dumps({
-                            "action": "watch_video",
-                            "videoId": video.get('videoId', ''),
-                            "title": title
-                        })
-                    },
-                    {
-                        "type": "web_url",
-                        "title": "Voir sur YouTube",
-                        "url": f"https://www.youtube.com/watch?v={video.get('videoId', '')}"
-                    }
-                ]
-            }
-            elements.append(element)
+        elements = [_build_youtube_card(video) for video in videos]
         
         # Créer le message avec le template de carrousel
         message = {
@@ -972,31 +1416,25 @@ def send_youtube_results(sender_id, videos):
             }
         }
         
-        # Envoyer le message
-        payload = {
-            "recipient": {"id": sender_id},
-            "message": message
-        }
+        # Envoyer le message de confirmation et le carrousel en une seule requête
+        results = send_batch(sender_id, [
+            {"text": f"J'ai trouvé {len(videos)} vidéos. Voici les résultats:"},
+            message
+        ])
+        carousel_result = results[1] if results and len(results) > 1 else None
         
-        response = requests.post(
-            f"{MESSENGER_API_URL}?access_token={MESSENGER_ACCESS_TOKEN}",
-            headers={"Content-Type": "application/json"},
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Erreur lors de l'envoi du carrousel YouTube: {response.status_code} - {response.text}")
+        if not carousel_result or carousel_result.get('code') != 200:
+            logger.error(f"Erreur lors de l'envoi du carrousel YouTube: {carousel_result}")
             # Fallback: envoyer un message texte avec les liens
             fallback_message = "Voici les résultats de votre recherche:\n\n"
             for i, video in enumerate(videos[:5]):
                 fallback_message += f"{i+1}. {video.get('title', 'Vidéo YouTube')}\n"
-                fallback_message += f"   https://www.youtube.com/watch?v={video.get('videoId', '')}\n\n"
+                fallback_message += f"   {YOUTUBE_WATCH_URL}{video.get('videoId', '')}\n\n"
             send_text_message(sender_id, fallback_message)
         else:
-            logger.info(f"Carrousel YouTube envoyé avec succès: {response.json()}")
+            logger.info("Carrousel YouTube envoyé avec succès: %s", carousel_result.get('body'))
         
         logger.info("Message envoyé avec succès")
     except Exception as e:
-        logger.error(f"Erreur lors de l'envoi des résultats YouTube: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'envoi des résultats YouTube: {str(e)}")
         send_text_message(sender_id, "Désolé, je n'ai pas pu afficher les résultats de recherche. Veuillez réessayer plus tard.")
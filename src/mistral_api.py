@@ -1,10 +1,15 @@
 import os
 import json
 import time
-import http.client
-import traceback
+import re
+import threading
+import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import List, Dict, Any, Optional
 from src.utils.logger import get_logger
+from src.utils import json_utils
 
 logger = get_logger(__name__)
 
@@ -13,9 +18,63 @@ RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY', "df674bbd36msh112ab45b7712473p16f9
 RAPIDAPI_HOST = "copilot5.p.rapidapi.com"
 COPILOT_API_ENDPOINT = "/copilot"
 
-# Timeout pour les requêtes (en secondes)
+COPILOT_API_URL = f"https://{RAPIDAPI_HOST}{COPILOT_API_ENDPOINT}"
+
+# En-têtes des requêtes Copilot, identiques d'un appel à l'autre
+COPILOT_HEADERS = {
+    'x-rapidapi-key': RAPIDAPI_KEY,
+    'x-rapidapi-host': RAPIDAPI_HOST,
+    'Content-Type': "application/json"
+}
+
+# Timeout pour les requêtes (en secondes) : lecture de la réponse générée
 REQUEST_TIMEOUT = 45
 
+# Délai d'établissement de la connexion (en secondes) : un service injoignable échoue vite
+CONNECT_TIMEOUT = 5
+
+# Session HTTP partagée : la connexion TLS vers RapidAPI reste ouverte d'un message à l'autre.
+# Seuls les échecs de connexion et les codes indiquant une requête non traitée sont réessayés
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=2,
+        connect=2,
+        read=0,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False
+    )
+))
+
+# Cache des réponses Copilot, indexé par le prompt normalisé (casse et espaces) : un message
+# déjà posé est servi sans nouvel appel payant à RapidAPI
+_response_cache = TTLCache(maxsize=10000, ttl=3600)
+_response_cache_lock = threading.Lock()
+
+# Prompts dont la réponse dépend du moment de la question (jamais mis en cache)
+_TIME_SENSITIVE_RE = re.compile(r"\b(heure|date|aujourd|maintenant|demain|hier|actualit|time|now|today)", re.IGNORECASE)
+
+def _response_cache_key(prompt: str) -> Optional[str]:
+    """
+    Calcule la clé de cache d'un prompt
+    
+    Args:
+        prompt: Message de l'utilisateur
+        
+    Returns:
+        Prompt normalisé, ou None si la réponse ne doit pas être mise en cache
+    """
+    if _TIME_SENSITIVE_RE.search(prompt):
+        return None
+    # Normalisation prudente : seuls la casse, les espaces et la ponctuation finale sont ignorés
+    # (« 2+2 » et « 22 » ne doivent pas partager la même réponse)
+    return " ".join(prompt.casefold().split()).rstrip("?!. ") or None
+
 def generate_mistral_response(prompt: str, user_id: str = None) -> str:
     """
     Génère une réponse en utilisant l'API Copilot via RapidAPI
@@ -36,6 +95,15 @@ def generate_mistral_response(prompt: str, user_id: str = None) -> str:
         
         conversation_id = None
         
+        # Servir la réponse depuis le cache si le même message a déjà été posé
+        cache_key = _response_cache_key(prompt)
+        if cache_key is not None:
+            with _response_cache_lock:
+                cached = _response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Réponse Copilot trouvée dans le cache: {cached[:50]}...")
+                return cached
+        
         logger.info(f"Envoi de la requête à Copilot avec conversation_id: {conversation_id}")
         
         # Générer la réponse avec Copilot
@@ -46,6 +114,11 @@ def generate_mistral_response(prompt: str, user_id: str = None) -> str:
             response_text = response_data.get("text", "")
             new_conversation_id = response_data.get("conversation_id")
             
+            # Mettre en cache les réponses réussies uniquement (les messages d'erreur n'ont pas de conversation_id)
+            if cache_key is not None and response_text and "conversation_id" in response_data:
+                with _response_cache_lock:
+                    _response_cache[cache_key] = response_text
+            
             # Stocker le nouvel ID de conversation si disponible
             if new_conversation_id and user_id:
                 try:
@@ -59,8 +132,7 @@ def generate_mistral_response(prompt: str, user_id: str = None) -> str:
         logger.info(f"Réponse Copilot émise: {response_text[:50]}...")
         return response_text
     except Exception as e:
-        logger.error(f"Erreur lors de la génération de la réponse: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la génération de la réponse: {str(e)}")
         return "Désolé, je n'ai pas pu générer de réponse. Veuillez réessayer plus tard."
 
 def generate_copilot_response(message: str, conversation_id: str = None) -> Dict[str, Any]:
@@ -82,71 +154,54 @@ def generate_copilot_response(message: str, conversation_id: str = None) -> Dict
             "markdown": True
         }
         
-        payload = json.dumps(payload_data)
-        
-        # Préparer les en-têtes
-        headers = {
-            'x-rapidapi-key': RAPIDAPI_KEY,
-            'x-rapidapi-host': RAPIDAPI_HOST,
-            'Content-Type': "application/json"
-        }
+        payload = json_utils.dumps(payload_data)
         
         # Mesurer le temps de réponse
         start_time = time.time()
         
-        # Établir la connexion
-        conn = http.client.HTTPSConnection(RAPIDAPI_HOST, timeout=REQUEST_TIMEOUT)
+        # Envoyer la requête sur la connexion partagée
+        res = _SESSION.post(COPILOT_API_URL, data=payload, headers=COPILOT_HEADERS, timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
         
-        # Envoyer la requête
-        try:
-            conn.request("POST", COPILOT_API_ENDPOINT, payload, headers)
-            
-            # Obtenir la réponse
-            res = conn.getresponse()
-            data = res.read()
+        # Calculer le temps de réponse
+        response_time = time.time() - start_time
+        logger.info(f"Réponse reçue de Copilot en {response_time:.2f} secondes")
+        
+        # Vérifier le code de statut
+        if res.status_code != 200:
+            error_message = f"Erreur de l'API Copilot: {res.status_code} - {res.text}"
+            logger.error(error_message)
             
-            # Calculer le temps de réponse
-            response_time = time.time() - start_time
-            logger.info(f"Réponse reçue de Copilot en {response_time:.2f} secondes")
+            # Gérer les erreurs spécifiques
+            if res.status_code == 429:
+                return {"text": "Désolé, le service est actuellement très sollicité. Veuillez réessayer dans quelques instants."}
+            elif res.status_code == 500:
+                return {"text": "Désolé, le service rencontre des difficultés techniques. Veuillez réessayer plus tard."}
+            else:
+                return {"text": f"Désolé, je n'ai pas pu générer de réponse. Erreur: {res.status_code}"}
+        
+        # Analyser la réponse
+        try:
+            response_data = json_utils.loads(res.content)
+            logger.info(f"Structure de la réponse: {list(response_data.keys())}")
             
-            # Vérifier le code de statut
-            if res.status != 200:
-                error_message = f"Erreur de l'API Copilot: {res.status} - {data.decode('utf-8')}"
-                logger.error(error_message)
-                
-                # Gérer les erreurs spécifiques
-                if res.status == 429:
-                    return {"text": "Désolé, le service est actuellement très sollicité. Veuillez réessayer dans quelques instants."}
-                elif res.status == 500:
-                    return {"text": "Désolé, le service rencontre des difficultés techniques. Veuillez réessayer plus tard."}
-                else:
-                    return {"text": f"Désolé, je n'ai pas pu générer de réponse. Erreur: {res.status}"}
+            # Extraire le texte de la réponse et l'ID de conversation
+            result = {
+                "text": response_data.get("text", ""),
+                "conversation_id": response_data.get("conversation_id")
+            }
             
-            # Analyser la réponse
-            response_text = data.decode("utf-8")
-            try:
-                response_data = json.loads(response_text)
-                logger.info(f"Structure de la réponse: {list(response_data.keys())}")
-                
-                # Extraire le texte de la réponse et l'ID de conversation
-                result = {
-                    "text": response_data.get("text", ""),
-                    "conversation_id": response_data.get("conversation_id")
-                }
-                
-                return result
-            except json.JSONDecodeError:
-                logger.error(f"Impossible de décoder la réponse JSON: {response_text[:500]}...")
-                return {"text": "Désolé, je n'ai pas pu comprendre la réponse du service. Veuillez réessayer."}
-        finally:
-            # Fermer la connexion
-            conn.close()
-    except http.client.HTTPException as e:
+            return result
+        except json.JSONDecodeError:
+            logger.error(f"Impossible de décoder la réponse JSON: {res.content[:500].decode('utf-8', 'replace')}...")
+            return {"text": "Désolé, je n'ai pas pu comprendre la réponse du service. Veuillez réessayer."}
+    except requests.Timeout as e:
+        logger.error(f"Délai dépassé lors de la requête à l'API Copilot: {str(e)}")
+        return {"text": "Désolé, le service de génération met trop de temps à répondre. Veuillez réessayer plus tard."}
+    except requests.ConnectionError as e:
         logger.error(f"Erreur HTTP lors de la requête à l'API Copilot: {str(e)}")
         return {"text": "Désolé, je n'ai pas pu me connecter au service de génération. Veuillez réessayer plus tard."}
     except Exception as e:
-        logger.error(f"Erreur lors de la génération avec Copilot: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la génération avec Copilot: {str(e)}")
         return {"text": "Désolé, je n'ai pas pu générer de réponse. Une erreur inattendue s'est produite."}
 
 # Fonctions pour gérer les IDs de conversation
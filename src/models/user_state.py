@@ -0,0 +1,93 @@
+import os
+import threading
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from src.database import get_database, USER_STATE_TTL
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class UserStateStore:
+    """
+    États des utilisateurs (mode youtube, mistral, imdb_search...) partagés entre les workers
+    via la collection MongoDB user_states, derrière un cache de lecture de quelques secondes
+    """
+    def __init__(self, read_ttl=5, maxsize=10000):
+        self.shared = bool(os.environ.get("MONGODB_URI"))
+        # Dernier état connu : seule source sans MongoDB, solution de repli si la base est injoignable
+        # (même durée de conservation que l'index TTL de la collection user_states)
+        self._local = TTLCache(maxsize=maxsize, ttl=USER_STATE_TTL)
+        # États lus récemment : évite une requête MongoDB par message d'une même rafale
+        # (un changement fait par un autre worker est vu au plus tard après read_ttl secondes)
+        self._recent = TTLCache(maxsize=maxsize, ttl=read_ttl)
+        self._lock = threading.RLock()
+
+    def get(self, sender_id, default=None):
+        """
+        Récupère l'état d'un utilisateur
+
+        Args:
+            sender_id (str): ID de l'utilisateur
+            default: Valeur retournée si l'utilisateur n'a pas d'état
+
+        Returns:
+            str: État de l'utilisateur ou default
+        """
+        if self.shared:
+            with self._lock:
+                state = self._recent.get(sender_id)
+            if state is not None:
+                return state
+
+            # Lire l'état dans MongoDB : un autre worker a pu le modifier (les absences d'état
+            # ne sont pas mises en cache, un mode activé ailleurs est vu immédiatement)
+            try:
+                db = get_database()
+                if db is not None:
+                    document = db.user_states.find_one({"_id": sender_id}, {"state": 1})
+                    state = document.get("state") if document else None
+
+                    # Garder la dernière valeur connue pour le cas où la base deviendrait injoignable
+                    with self._lock:
+                        if state is None:
+                            self._local.pop(sender_id, None)
+                        else:
+                            self._local[sender_id] = state
+                            self._recent[sender_id] = state
+
+                    return default if state is None else state
+            except Exception as e:
+                logger.error(f"Erreur lors de la lecture de l'état utilisateur: {str(e)}")
+
+        # Sans MongoDB (ou s'il est injoignable), utiliser le cache local
+        with self._lock:
+            state = self._local.get(sender_id)
+
+        return default if state is None else state
+
+    def __getitem__(self, sender_id):
+        state = self.get(sender_id)
+        if state is None:
+            raise KeyError(sender_id)
+        return state
+
+    def __contains__(self, sender_id):
+        return self.get(sender_id) is not None
+
+    def __setitem__(self, sender_id, state):
+        with self._lock:
+            self._local[sender_id] = state
+            self._recent[sender_id] = state
+
+        if self.shared:
+            try:
+                db = get_database()
+                if db is not None:
+                    db.user_states.update_one(
+                        {"_id": sender_id},
+                        # Date UTC : l'index TTL de MongoDB interprète les dates naïves comme UTC
+                        {"$set": {"state": state, "updated_at": datetime.now(timezone.utc)}},
+                        upsert=True
+                    )
+            except Exception as e:
+                logger.error(f"Erreur lors de l'enregistrement de l'état utilisateur: {str(e)}")
@@ -0,0 +1,16 @@
+import os
+
+def get_file_size(path):
+    """
+    Retourne la taille d'un fichier en un seul appel système
+    
+    Args:
+        path (str): Chemin du fichier
+        
+    Returns:
+        int: Taille du fichier en octets, ou -1 si le fichier n'existe pas
+    """
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return -1
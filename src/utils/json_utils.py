@@ -0,0 +1,35 @@
+import json
+
+# orjson (implémentation C) est utilisé s'il est installé, sinon le module json standard
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data):
+    """
+    Décode un document JSON
+    
+    Args:
+        data: Document JSON (str ou bytes)
+        
+    Returns:
+        Objet Python décodé
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj):
+    """
+    Encode un objet en JSON compact, directement en UTF-8
+    
+    Args:
+        obj: Objet à encoder
+        
+    Returns:
+        Document JSON sous forme de bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -1,7 +1,9 @@
 import logging
+import json
 import os
 import sys
 from logging.handlers import RotatingFileHandler
+from src.utils import json_utils
 
 # Créer le répertoire de logs s'il n'existe pas
 log_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs')
@@ -11,6 +13,41 @@ os.makedirs(log_dir, exist_ok=True)
 log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 date_format = '%Y-%m-%d %H:%M:%S'
 
+# Niveau de log configurable (INFO par défaut), par exemple LOG_LEVEL=WARNING en production
+log_level = getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+
+class LazyJson:
+    """
+    Sérialise un objet en JSON uniquement si le message de log est effectivement émis
+    """
+    __slots__ = ('obj', 'limit', 'indent')
+    
+    def __init__(self, obj, limit=None, indent=None):
+        self.obj = obj
+        self.limit = limit
+        self.indent = indent
+    
+    def __str__(self):
+        if self.indent is None:
+            text = json_utils.dumps(self.obj).decode("utf-8")
+        else:
+            text = json.dumps(self.obj, indent=self.indent)
+        return text[:self.limit] if self.limit else text
+
+def lazy_json(obj, limit=None, indent=None):
+    """
+    Prépare un objet pour être journalisé en JSON avec un formatage paresseux
+    
+    Args:
+        obj: Objet à journaliser
+        limit: Nombre maximum de caractères à conserver (optionnel)
+        indent: Indentation du JSON (optionnel)
+        
+    Returns:
+        Objet à passer en argument %s du logger
+    """
+    return LazyJson(obj, limit, indent)
+
 def get_logger(name):
     """
     Crée et configure un logger
@@ -27,18 +64,18 @@ def get_logger(name):
     if logger.handlers:
         return logger
     
-    logger.setLevel(logging.INFO)
+    logger.setLevel(log_level)
     
     # Créer un handler pour la console
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(log_level)
     console_formatter = logging.Formatter(log_format, date_format)
     console_handler.setFormatter(console_formatter)
     
     # Créer un handler pour le fichier de log
     log_file = os.path.join(log_dir, 'chatbot.log')
     file_handler = RotatingFileHandler(log_file, maxBytes=10*1024*1024, backupCount=5)
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(log_level)
     file_formatter = logging.Formatter(log_format, date_format)
     file_handler.setFormatter(file_formatter)
     
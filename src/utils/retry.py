@@ -0,0 +1,37 @@
+import time
+import random
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def retry_with_backoff(fn, should_retry, max_attempts=3, base_delay=1.0, max_delay=30.0):
+    """
+    Exécute une fonction en réessayant les échecs transitoires
+    (backoff exponentiel tronqué avec jitter)
+
+    Args:
+        fn: Fonction sans argument à exécuter
+        should_retry: Fonction (résultat, exception) -> bool indiquant si l'échec est transitoire
+        max_attempts: Nombre maximum de tentatives
+        base_delay: Délai de base entre deux tentatives (en secondes)
+        max_delay: Délai maximum entre deux tentatives (en secondes)
+
+    Returns:
+        Résultat de la dernière tentative (l'exception de la dernière tentative est relancée)
+    """
+    for attempt in range(max_attempts):
+        try:
+            result, error = fn(), None
+        except Exception as e:
+            result, error = None, e
+
+        # Rendre le résultat si l'échec n'est pas transitoire ou si les tentatives sont épuisées
+        if attempt == max_attempts - 1 or not should_retry(result, error):
+            if error is not None:
+                raise error
+            return result
+
+        # Attendre avant de réessayer, avec un jitter pour éviter les rafales synchronisées
+        delay = min(max_delay, base_delay * 2 ** attempt) * (1 + random.random() * 0.5)
+        logger.warning(f"Échec transitoire (tentative {attempt+1}/{max_attempts}), nouvelle tentative dans {delay:.1f} secondes")
+        time.sleep(delay)
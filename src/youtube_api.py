@@ -3,7 +3,6 @@ import re
 import time
 import json
 import threading
-import traceback
 import tempfile
 import requests
 import http.client
@@ -12,7 +11,9 @@ import subprocess
 import sys
 from typing import Dict, Any, List, Optional, Callable
 from urllib.parse import urlparse, parse_qs, quote
-from src.utils.logger import get_logger
+from cachetools import TTLCache
+from src.utils.logger import get_logger, lazy_json
+from src.utils.file_utils import get_file_size
 
 logger = get_logger(__name__)
 
@@ -32,13 +33,38 @@ download_thread_running = False
 
 # Répertoire de cache pour les vidéos téléchargées
 CACHE_DIR = "/tmp/youtube_cache"
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR)
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# Cache des détails des vidéos (les métadonnées changent rarement)
+_video_details_cache = TTLCache(maxsize=2048, ttl=3600)
+_video_details_lock = threading.Lock()
+
+def _cache_video_details(video_id, details):
+    """
+    Met en cache les détails d'une vidéo
+    
+    Args:
+        video_id: ID de la vidéo YouTube
+        details: Dictionnaire contenant les détails de la vidéo
+        
+    Returns:
+        Copie des détails, modifiable par l'appelant sans altérer le cache
+    """
+    with _video_details_lock:
+        _video_details_cache[video_id] = details
+    return dict(details)
 
 # Configuration de l'API RapidAPI
 RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY', "8d49b2bba0msh354f73491c52cf7p1ed89ejsnc355746b4acb")
 RAPIDAPI_HOST = "youtube-downloader-api-fast-reliable-and-easy.p.rapidapi.com"
 
+# Délais des appels à l'API YouTube Data (connexion, lecture) et à l'API de téléchargement
+REQUEST_TIMEOUT = (3, 10)
+RAPIDAPI_TIMEOUT = 30
+
+# Taille des blocs lus et écrits lors du téléchargement d'une vidéo (moins d'appels système)
+DOWNLOAD_CHUNK_SIZE = 65536
+
 def extract_video_id(url_or_id):
     """
     Extrait l'ID de la vidéo YouTube à partir d'une URL ou d'un ID
@@ -88,8 +114,7 @@ def extract_video_id(url_or_id):
         logger.warning(f"Impossible d'extraire l'ID vidéo de: {url_or_id}")
         return None
     except Exception as e:
-        logger.error(f"Erreur lors de l'extraction de l'ID vidéo: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'extraction de l'ID vidéo: {str(e)}")
         return None
 
 def get_video_details(video_id):
@@ -110,13 +135,20 @@ def get_video_details(video_id):
             logger.warning(f"ID vidéo invalide: {video_id}")
             return None
         
+        # Vérifier si les détails sont déjà en cache
+        with _video_details_lock:
+            cached = _video_details_cache.get(video_id)
+        if cached is not None:
+            logger.info(f"Détails de la vidéo trouvés dans le cache: {video_id}")
+            return dict(cached)
+        
         # Utiliser l'API YouTube Data pour récupérer les détails
         api_key = os.environ.get('YOUTUBE_API_KEY')
         
         if api_key:
             try:
                 url = f"https://www.googleapis.com/youtube/v3/videos?id={video_id}&key={api_key}&part=snippet,contentDetails,statistics"
-                response = requests.get(url)
+                response = requests.get(url, timeout=REQUEST_TIMEOUT)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -125,14 +157,14 @@ def get_video_details(video_id):
                         item = data['items'][0]
                         snippet = item.get('snippet', {})
                         
-                        return {
+                        return _cache_video_details(video_id, {
                             'videoId': video_id,
                             'title': snippet.get('title', ''),
                             'description': snippet.get('description', ''),
                             'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url', f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"),
                             'channelTitle': snippet.get('channelTitle', ''),
                             'publishedAt': snippet.get('publishedAt', '')
-                        }
+                        })
                     else:
                         logger.warning(f"Aucun élément trouvé pour la vidéo: {video_id}")
                 else:
@@ -143,7 +175,7 @@ def get_video_details(video_id):
         # Méthode alternative: scraper la page YouTube
         try:
             url = f"https://www.youtube.com/watch?v={video_id}"
-            response = requests.get(url)
+            response = requests.get(url, timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 # Extraire le titre
@@ -154,12 +186,12 @@ def get_video_details(video_id):
                 description_match = re.search(r'<meta name="description" content="(.*?)"', response.text)
                 description = description_match.group(1) if description_match else ''
                 
-                return {
+                return _cache_video_details(video_id, {
                     'videoId': video_id,
                     'title': title,
                     'description': description,
                     'thumbnail': f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
-                }
+                })
             else:
                 logger.warning(f"Erreur lors de la récupération de la page YouTube: {response.status_code}")
         except Exception as e:
@@ -173,8 +205,7 @@ def get_video_details(video_id):
             'thumbnail': f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
         }
     except Exception as e:
-        logger.error(f"Erreur lors de la récupération des détails de la vidéo: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la récupération des détails de la vidéo: {str(e)}")
         return None
 
 def search_youtube(query, max_results=10):
@@ -197,7 +228,7 @@ def search_youtube(query, max_results=10):
         if api_key:
             try:
                 url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={query}&key={api_key}&type=video&maxResults={max_results}"
-                response = requests.get(url)
+                response = requests.get(url, timeout=REQUEST_TIMEOUT)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -228,8 +259,7 @@ def search_youtube(query, max_results=10):
         logger.warning("La recherche YouTube a échoué")
         return []
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche YouTube: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de la recherche YouTube: {str(e)}")
         return []
 
 def download_youtube_video(video_id, output_path, callback=None):
@@ -261,8 +291,7 @@ def download_youtube_video(video_id, output_path, callback=None):
         
         return True
     except Exception as e:
-        logger.error(f"Erreur lors de l'ajout du téléchargement à la file d'attente: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors de l'ajout du téléchargement à la file d'attente: {str(e)}")
         
         if callback:
             callback(None)
@@ -329,8 +358,7 @@ def process_download_queue():
                     callback(result)
                     logger.info(f"Callback terminé pour la vidéo {video_id}")
             except Exception as e:
-                logger.error(f"Erreur lors du téléchargement de la vidéo: {str(e)}")
-                logger.error(traceback.format_exc())
+                logger.exception(f"Erreur lors du téléchargement de la vidéo: {str(e)}")
                 
                 if callback:
                     callback(None)
@@ -342,8 +370,7 @@ def process_download_queue():
             # Attendre un peu pour éviter de surcharger le système
             time.sleep(0.5)
     except Exception as e:
-        logger.error(f"Erreur dans le thread de téléchargement: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur dans le thread de téléchargement: {str(e)}")
     finally:
         download_thread_running = False
         logger.info("Thread de téléchargement arrêté")
@@ -359,7 +386,7 @@ def is_valid_mp4(file_path):
         True si le fichier est un MP4 valide, False sinon
     """
     try:
-        if not os.path.exists(file_path) or os.path.getsize(file_path) < 10000:
+        if get_file_size(file_path) < 10000:
             return False
         
         # Vérifier l'en-tête du fichier
@@ -395,7 +422,7 @@ def download_with_youtube_search_download(video_id, output_path):
         encoded_url = quote(youtube_url, safe='')
         
         # Utiliser la nouvelle API RapidAPI
-        conn = http.client.HTTPSConnection(RAPIDAPI_HOST)
+        conn = http.client.HTTPSConnection(RAPIDAPI_HOST, timeout=RAPIDAPI_TIMEOUT)
         
         headers = {
             'x-rapidapi-key': RAPIDAPI_KEY,
@@ -503,14 +530,14 @@ def download_with_youtube_search_download(video_id, output_path):
                         
                         if response.status_code == 200:
                             # Écrire le fichier sur le disque
-                            with open(output_path, 'wb') as f:
-                                for chunk in response.iter_content(chunk_size=8192):
+                            with open(output_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                                     if chunk:
                                         f.write(chunk)
                             
                             # Vérifier si le fichier a été téléchargé correctement
-                            if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:
-                                file_size = os.path.getsize(output_path)
+                            file_size = get_file_size(output_path)
+                            if file_size > 10000:
                                 logger.info(f"Nouvelle API RapidAPI - Vidéo téléchargée avec succès: {output_path} ({file_size} octets)")
                                 
                                 # Vérifier si le fichier est un MP4 valide
@@ -548,15 +575,14 @@ def download_with_youtube_search_download(video_id, output_path):
                 return None  # Si toutes les tentatives échouent
             else:
                 logger.error("Nouvelle API RapidAPI - Aucune URL de téléchargement trouvée dans la réponse")
-                logger.error(f"Nouvelle API RapidAPI - Structure de la réponse: {json.dumps(result, indent=2)[:500]}")
+                logger.error("Nouvelle API RapidAPI - Structure de la réponse: %s", lazy_json(result, limit=500, indent=2))
                 return None
             
         except json.JSONDecodeError:
             logger.error(f"Nouvelle API RapidAPI - Impossible de décoder la réponse JSON: {data.decode('utf-8', errors='ignore')[:500]}")
             return None
     except Exception as e:
-        logger.error(f"Nouvelle API RapidAPI - Erreur lors du téléchargement: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Nouvelle API RapidAPI - Erreur lors du téléchargement: {str(e)}")
         return None
 
 def download_with_yt_dlp(video_id, output_path):
@@ -597,6 +623,7 @@ def download_with_yt_dlp(video_id, output_path):
             "--fragment-retries", "3",  # Réessayer les fragments 3 fois
             "--extractor-retries", "3",  # Réessayer l'extraction 3 fois
             "--no-warnings",  # Réduire les messages de warning
+            "--buffer-size", "64K",  # Écrire sur le disque par blocs de 64 Ko
             "-o", output_path,
             youtube_url
         ]
@@ -652,8 +679,8 @@ def download_with_yt_dlp(video_id, output_path):
                 pass
             
             # Vérifier si le fichier a été téléchargé correctement
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:
-                file_size = os.path.getsize(output_path)
+            file_size = get_file_size(output_path)
+            if file_size > 10000:
                 logger.info(f"Vidéo téléchargée avec succès via yt-dlp: {output_path} ({file_size} octets)")
                 
                 # Vérifier si le fichier est un MP4 valide
@@ -673,8 +700,7 @@ def download_with_yt_dlp(video_id, output_path):
             logger.error(f"Erreur lors de l'exécution de yt-dlp: {str(e)}")
             return None
     except Exception as e:
-        logger.error(f"Erreur lors du téléchargement avec yt-dlp: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors du téléchargement avec yt-dlp: {str(e)}")
         return None
 
 def download_video(video_id, output_path):
@@ -698,27 +724,27 @@ def download_video(video_id, output_path):
         
         # Vérifier si la vidéo est déjà dans le cache
         cache_path = os.path.join(CACHE_DIR, f"{video_id}.mp4")
-        if os.path.exists(cache_path) and os.path.getsize(cache_path) > 10000 and is_valid_mp4(cache_path):
+        if is_valid_mp4(cache_path):
             logger.info(f"Vidéo trouvée dans le cache: {cache_path}")
             
             # Copier le fichier du cache vers le chemin de sortie
             shutil.copy2(cache_path, output_path)
             
             # Vérifier si le fichier a été copié correctement
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:
-                logger.info(f"Vidéo copiée du cache: {output_path} ({os.path.getsize(output_path)} octets)")
+            file_size = get_file_size(output_path)
+            if file_size > 10000:
+                logger.info(f"Vidéo copiée du cache: {output_path} ({file_size} octets)")
                 return output_path
         
         # Créer le répertoire de sortie s'il n'existe pas
         output_dir = os.path.dirname(output_path)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        os.makedirs(output_dir, exist_ok=True)
         
         logger.info("Tentative de téléchargement avec yt-dlp")
         result = download_with_yt_dlp(video_id, output_path)
         
         # Si yt-dlp a réussi, retourner le résultat
-        if result and os.path.exists(result) and is_valid_mp4(result):
+        if result and is_valid_mp4(result):
             # Ajouter la vidéo au cache
             try:
                 shutil.copy2(result, cache_path)
@@ -733,7 +759,7 @@ def download_video(video_id, output_path):
         result = download_with_youtube_search_download(video_id, output_path)
         
         # Si le téléchargement a réussi, retourner le résultat
-        if result and os.path.exists(result) and is_valid_mp4(result):
+        if result and is_valid_mp4(result):
             # Ajouter la vidéo au cache
             try:
                 shutil.copy2(result, cache_path)
@@ -748,8 +774,7 @@ def download_video(video_id, output_path):
         return None
         
     except Exception as e:
-        logger.error(f"Erreur lors du téléchargement de la vidéo: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Erreur lors du téléchargement de la vidéo: {str(e)}")
         return None
 
 def stop_download_thread():
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import database
+
+class TestDatabase(unittest.TestCase):
+    
+    def setUp(self):
+        database._db = None
+        database._last_failure = None
+    
+    def tearDown(self):
+        database._db = None
+        database._last_failure = None
+    
+    @patch.dict(os.environ, {"MONGODB_URI": "mongodb://test"})
+    @patch('src.database.MongoClient')
+    def test_failed_connection_is_not_retried_immediately(self, mock_client):
+        """Test qu'un échec de connexion n'est pas retenté à chaque appel"""
+        mock_client.return_value.admin.command.side_effect = Exception("injoignable")
+        
+        self.assertIsNone(database.get_database())
+        self.assertIsNone(database.get_database())
+        mock_client.assert_called_once()
+    
+    @patch.dict(os.environ, {"MONGODB_URI": "mongodb://test"})
+    @patch('src.database.time.monotonic')
+    @patch('src.database.MongoClient')
+    def test_connection_is_retried_after_delay(self, mock_client, mock_monotonic):
+        """Test la nouvelle tentative de connexion après RECONNECT_DELAY"""
+        mock_monotonic.return_value = 1000.0
+        mock_client.return_value.admin.command.side_effect = [Exception("injoignable"), {"ok": 1}]
+        
+        self.assertIsNone(database.get_database())
+        
+        mock_monotonic.return_value = 1000.0 + database.RECONNECT_DELAY
+        self.assertIsNotNone(database.get_database())
+        self.assertEqual(mock_client.call_count, 2)
+        
+        # La connexion établie est réutilisée
+        database.get_database()
+        self.assertEqual(mock_client.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+import json
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils import json_utils
+
+class TestJsonUtils(unittest.TestCase):
+    
+    def test_dumps_returns_compact_utf8_bytes(self):
+        """Test l'encodage en JSON compact, en UTF-8"""
+        data = json_utils.dumps({"title": "Vidéo", "ids": [1, 2]})
+        
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(data, '{"title":"Vidéo","ids":[1,2]}'.encode("utf-8"))
+    
+    def test_loads_accepts_str_and_bytes(self):
+        """Test le décodage depuis str et bytes"""
+        expected = {"text": "Réponse", "conversation_id": None}
+        
+        self.assertEqual(json_utils.loads('{"text": "Réponse", "conversation_id": null}'), expected)
+        self.assertEqual(json_utils.loads('{"text": "Réponse", "conversation_id": null}'.encode("utf-8")), expected)
+    
+    def test_round_trip(self):
+        """Test qu'un objet encodé puis décodé est inchangé"""
+        payload = {"recipient": {"id": "123"}, "message": {"text": "Voici la vidéo 'été' :"}}
+        
+        self.assertEqual(json_utils.loads(json_utils.dumps(payload)), payload)
+    
+    def test_invalid_json_raises_json_decode_error(self):
+        """Test qu'un document invalide lève json.JSONDecodeError (attendu par les appelants)"""
+        with self.assertRaises(json.JSONDecodeError):
+            json_utils.loads(b"<html>erreur</html>")
+    
+    @patch.object(json_utils, 'orjson', None)
+    def test_stdlib_fallback(self):
+        """Test le repli sur le module json standard sans orjson"""
+        self.assertEqual(json_utils.dumps({"title": "Vidéo", "ids": [1, 2]}), '{"title":"Vidéo","ids":[1,2]}'.encode("utf-8"))
+        self.assertEqual(json_utils.loads(b'{"a": 1}'), {"a": 1})
+        with self.assertRaises(json.JSONDecodeError):
+            json_utils.loads(b"<html>erreur</html>")
+
+if __name__ == '__main__':
+    unittest.main()
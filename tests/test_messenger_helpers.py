@@ -0,0 +1,242 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import sys
+import os
+import types
+import tempfile
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# src.conversation_memory (importé par messenger_api) est absent du dépôt :
+# le remplacer par un module minimal pour pouvoir tester les fonctions d'envoi et de dispatch
+try:
+    import src.conversation_memory
+except ImportError:
+    conversation_memory = types.ModuleType("src.conversation_memory")
+    conversation_memory.clear_user_history = lambda user_id: None
+    sys.modules["src.conversation_memory"] = conversation_memory
+
+from src.messenger_api import send_batch, GRAPH_BATCH_LIMIT, _is_transient_graph_error
+from src.messenger_api import _COMMAND_RE, handle_message, user_states
+from src.messenger_api import _SESSION
+from src.messenger_api import handle_watch_video, pending_downloads, _TEMP_DIR_POOL
+from src.messenger_api import handle_download_callback, handle_image_callback
+import requests
+
+@patch('src.messenger_api.MESSENGER_ACCESS_TOKEN', 'test-token')
+@patch('src.messenger_api.GRAPH_BATCH_URL', 'https://graph.facebook.com/v18.0/?access_token=test-token')
+class TestSendBatch(unittest.TestCase):
+    
+    def _batch_response(self, count):
+        """Construit une réponse simulée de l'endpoint batch"""
+        response = MagicMock()
+        response.status_code = 200
+        response.content = json.dumps([{"code": 200, "body": "{}"}] * count).encode("utf-8")
+        return response
+    
+    @patch('src.messenger_api._SESSION.post')
+    def test_send_batch_operations(self, mock_post):
+        """Test la construction des sous-requêtes d'un envoi groupé"""
+        mock_post.return_value = self._batch_response(3)
+        
+        results = send_batch("123", [{"text": "a"}, {"text": "b"}, {"text": "c"}])
+        
+        self.assertEqual(len(results), 3)
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args[0][0], "https://graph.facebook.com/v18.0/?access_token=test-token")
+        batch = json.loads(mock_post.call_args[1]["data"]["batch"])
+        self.assertEqual([op["name"] for op in batch], ["msg0", "msg1", "msg2"])
+        self.assertNotIn("depends_on", batch[0])
+        self.assertEqual(batch[1]["depends_on"], "msg0")
+        self.assertEqual(batch[2]["depends_on"], "msg1")
+        # Chaque sous-requête, y compris celles dont une autre dépend, doit renvoyer sa réponse
+        self.assertTrue(all(op["omit_response_on_success"] is False for op in batch))
+    
+    @patch('src.messenger_api._SESSION.post')
+    def test_send_batch_splits_large_batches(self, mock_post):
+        """Test le découpage en lots de GRAPH_BATCH_LIMIT messages"""
+        mock_post.side_effect = [self._batch_response(GRAPH_BATCH_LIMIT), self._batch_response(1)]
+        
+        results = send_batch("123", [{"text": str(i)} for i in range(GRAPH_BATCH_LIMIT + 1)])
+        
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(len(results), GRAPH_BATCH_LIMIT + 1)
+        second_batch = json.loads(mock_post.call_args_list[1][1]["data"]["batch"])
+        self.assertEqual(len(second_batch), 1)
+        self.assertNotIn("depends_on", second_batch[0])
+    
+    @patch('src.messenger_api._SESSION.post')
+    def test_send_batch_http_error(self, mock_post):
+        """Test l'échec de l'envoi groupé"""
+        mock_post.return_value = MagicMock(status_code=500, text="erreur")
+        
+        self.assertIsNone(send_batch("123", [{"text": "a"}]))
+
+class TestTransientGraphError(unittest.TestCase):
+    
+    def test_connection_errors_are_retried(self):
+        """Test que les échecs de connexion sont réessayés"""
+        self.assertTrue(_is_transient_graph_error(None, requests.ConnectionError()))
+        self.assertTrue(_is_transient_graph_error(None, requests.ConnectTimeout()))
+    
+    def test_read_timeout_is_not_retried(self):
+        """Test qu'un délai de lecture dépassé n'est pas réessayé (envoi peut-être déjà accepté)"""
+        self.assertFalse(_is_transient_graph_error(None, requests.ReadTimeout()))
+        self.assertFalse(_is_transient_graph_error(None, ValueError()))
+    
+    def test_session_does_not_resend_processed_messages(self):
+        """Test que la session partagée ne renvoie pas un message peut-être déjà remis"""
+        retry = _SESSION.get_adapter("https://graph.facebook.com").max_retries
+        
+        self.assertTrue(retry.is_retry("POST", 429))
+        self.assertTrue(retry.is_retry("POST", 503))
+        self.assertFalse(retry.is_retry("POST", 500))
+        self.assertFalse(retry.is_retry("POST", 502))
+        self.assertFalse(retry.is_retry("POST", 504))
+        self.assertEqual(retry.read, 0)
+    
+    def test_status_codes(self):
+        """Test les codes HTTP transitoires"""
+        self.assertTrue(_is_transient_graph_error(MagicMock(status_code=429), None))
+        self.assertTrue(_is_transient_graph_error(MagicMock(status_code=503), None))
+        self.assertFalse(_is_transient_graph_error(MagicMock(status_code=400), None))
+        self.assertFalse(_is_transient_graph_error(MagicMock(status_code=200), None))
+
+class TestMessengerCommands(unittest.TestCase):
+    
+    def test_command_groups(self):
+        """Test la reconnaissance des commandes"""
+        self.assertEqual(_COMMAND_RE.match("/yt").lastgroup, "yt")
+        self.assertEqual(_COMMAND_RE.match("/YT").lastgroup, "yt")
+        self.assertEqual(_COMMAND_RE.match("yt/").lastgroup, "mistral")
+        self.assertEqual(_COMMAND_RE.match("/reset").lastgroup, "reset")
+        self.assertEqual(_COMMAND_RE.match("/stream").lastgroup, "stream")
+        self.assertEqual(_COMMAND_RE.match("/stream Inception").lastgroup, "stream")
+        self.assertEqual(_COMMAND_RE.match("/img un chat").group("img"), "un chat")
+    
+    def test_command_exact_match(self):
+        """Test que seuls les messages réduits à la commande sont reconnus"""
+        self.assertIsNone(_COMMAND_RE.match("/yt\n"))
+        self.assertIsNone(_COMMAND_RE.match("/yt musique"))
+        self.assertIsNone(_COMMAND_RE.match("/streaming"))
+        self.assertIsNone(_COMMAND_RE.match("/img"))
+        self.assertIsNone(_COMMAND_RE.match("bonjour /yt"))
+    
+    def test_retry_keeps_video_id_case(self):
+        """Test que l'ID de vidéo de /retry conserve sa casse"""
+        self.assertEqual(_COMMAND_RE.match("/retry dQw4w9WgXcQ").group("retry"), "dQw4w9WgXcQ")
+        self.assertEqual(_COMMAND_RE.match("/retry dQw4w9WgXcQ autre").group("retry"), "dQw4w9WgXcQ")
+        self.assertEqual(_COMMAND_RE.match("/retry  dQw4w9WgXcQ").group("retry"), "")
+    
+    @patch('src.messenger_api.send_text_message')
+    def test_handle_message_dispatches_command(self, mock_send_text):
+        """Test que handle_message exécute la commande reconnue"""
+        handle_message("cmd-user", {"text": "/yt"})
+        self.assertEqual(user_states.get("cmd-user"), "youtube")
+        
+        handle_message("cmd-user", {"text": "yt/"})
+        self.assertEqual(user_states.get("cmd-user"), "mistral")
+        mock_send_text.assert_called_with("cmd-user", "Mode Mistral réactivé. Comment puis-je vous aider ?")
+    
+    @patch('src.messenger_api.handle_watch_video')
+    @patch('src.messenger_api.get_video_details')
+    @patch('src.messenger_api.delete_video_from_db')
+    def test_retry_command(self, mock_delete, mock_details, mock_watch):
+        """Test la commande /retry"""
+        mock_details.return_value = {"title": "Test Video"}
+        
+        handle_message("retry-user", {"text": "/retry dQw4w9WgXcQ"})
+        
+        mock_delete.assert_called_once_with("dQw4w9WgXcQ")
+        mock_watch.assert_called_once_with("retry-user", "dQw4w9WgXcQ", "Test Video", force_download=True)
+
+class TestWatchVideo(unittest.TestCase):
+    
+    @patch('src.messenger_api.send_text_message')
+    @patch('src.messenger_api.download_youtube_video')
+    def test_failed_queueing_releases_download(self, mock_download, mock_send_text):
+        """Test qu'un échec de mise en file libère le répertoire temporaire et le téléchargement en cours"""
+        mock_download.side_effect = Exception("file d'attente indisponible")
+        
+        handle_watch_video("watch-user", "dQw4w9WgXcQ", "Test Video")
+        
+        temp_dir = os.path.dirname(mock_download.call_args[0][1])
+        self.assertFalse(pending_downloads.get("watch-user"))
+        self.assertIn(temp_dir, list(_TEMP_DIR_POOL.queue))
+        
+        # Un nouveau téléchargement n'est pas bloqué
+        mock_download.side_effect = None
+        handle_watch_video("watch-user", "dQw4w9WgXcQ", "Test Video")
+        self.assertEqual(mock_download.call_count, 2)
+
+@patch('src.messenger_api.send_text_message')
+class TestDownloadCallback(unittest.TestCase):
+    
+    def setUp(self):
+        fd, self.video_path = tempfile.mkstemp(suffix=".mp4")
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\x00" * 1024)
+    
+    def tearDown(self):
+        if os.path.exists(self.video_path):
+            os.remove(self.video_path)
+    
+    @patch('src.messenger_api.upload_file')
+    @patch('src.messenger_api.send_file_attachment')
+    def test_small_video_is_not_uploaded_speculatively(self, mock_attachment, mock_upload, mock_send_text):
+        """Test qu'une petite vidéo envoyée directement n'est pas téléchargée sur Cloudinary"""
+        mock_attachment.return_value = {"message_id": "1"}
+        
+        handle_download_callback("dl-user", "dQw4w9WgXcQ", "Test Video", self.video_path)
+        
+        mock_attachment.assert_called_once_with("dl-user", self.video_path, "video")
+        mock_upload.assert_not_called()
+    
+    @patch('src.messenger_api.send_video_message')
+    @patch('src.messenger_api.upload_file')
+    @patch('src.messenger_api.send_file_attachment')
+    def test_small_video_falls_back_to_cloudinary(self, mock_attachment, mock_upload, mock_send_video, mock_send_text):
+        """Test le repli sur Cloudinary quand l'envoi direct échoue"""
+        mock_attachment.return_value = None
+        mock_upload.return_value = {"secure_url": "https://res.cloudinary.com/video/upload/v.mp4", "public_id": None}
+        
+        handle_download_callback("dl-user", "dQw4w9WgXcQ", "Test Video", self.video_path)
+        
+        mock_upload.assert_called_once()
+        mock_send_video.assert_called_once_with("dl-user", "https://res.cloudinary.com/video/upload/v.mp4")
+    
+    @patch('src.messenger_api.SPECULATIVE_UPLOAD_MIN_SIZE', 1)
+    @patch('src.messenger_api._UPLOAD_POOL')
+    @patch('src.messenger_api.send_file_attachment')
+    def test_speculative_upload_cancelled_on_direct_success(self, mock_attachment, mock_pool, mock_send_text):
+        """Test l'annulation du téléchargement anticipé quand l'envoi direct réussit"""
+        mock_attachment.return_value = {"message_id": "1"}
+        upload_future = mock_pool.submit.return_value
+        upload_future.cancel.return_value = True
+        
+        handle_download_callback("dl-user", "dQw4w9WgXcQ", "Test Video", self.video_path)
+        
+        mock_pool.submit.assert_called_once()
+        upload_future.cancel.assert_called_once()
+        upload_future.result.assert_not_called()
+
+class TestImageCallback(unittest.TestCase):
+    
+    @patch('src.messenger_api.send_file_attachment')
+    @patch('src.messenger_api.send_text_message')
+    def test_caption_is_sent_before_image(self, mock_send_text, mock_attachment):
+        """Test que le message d'annonce est envoyé avant l'image (ordre de remise garanti)"""
+        calls = []
+        mock_send_text.side_effect = lambda *args: calls.append("text")
+        mock_attachment.side_effect = lambda *args: calls.append("image") or {"message_id": "1"}
+        fd, image_path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        
+        handle_image_callback("img-user", "un chat", image_path)
+        
+        self.assertEqual(calls, ["text", "image"])
+
+if __name__ == '__main__':
+    unittest.main()
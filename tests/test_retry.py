@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.retry import retry_with_backoff
+
+class TestRetry(unittest.TestCase):
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_success_first_attempt(self, mock_sleep):
+        """Test qu'un appel réussi n'est pas réessayé"""
+        fn = MagicMock(return_value="ok")
+        
+        self.assertEqual(retry_with_backoff(fn, lambda result, error: False), "ok")
+        fn.assert_called_once()
+        mock_sleep.assert_not_called()
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_retries_transient_result(self, mock_sleep):
+        """Test qu'un résultat transitoire est réessayé jusqu'au succès"""
+        fn = MagicMock(side_effect=[503, 503, 200])
+        
+        result = retry_with_backoff(fn, lambda result, error: result == 503, max_attempts=3)
+        
+        self.assertEqual(result, 200)
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_returns_last_result_when_exhausted(self, mock_sleep):
+        """Test que le dernier résultat est rendu quand les tentatives sont épuisées"""
+        fn = MagicMock(return_value=503)
+        
+        result = retry_with_backoff(fn, lambda result, error: result == 503, max_attempts=3)
+        
+        self.assertEqual(result, 503)
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_non_transient_exception_is_raised(self, mock_sleep):
+        """Test qu'une exception non transitoire est relancée sans nouvelle tentative"""
+        fn = MagicMock(side_effect=ValueError("erreur"))
+        
+        with self.assertRaises(ValueError):
+            retry_with_backoff(fn, lambda result, error: isinstance(error, ConnectionError))
+        fn.assert_called_once()
+        mock_sleep.assert_not_called()
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_last_exception_is_raised(self, mock_sleep):
+        """Test que l'exception de la dernière tentative est relancée"""
+        fn = MagicMock(side_effect=[ConnectionError("1"), ConnectionError("2")])
+        
+        with self.assertRaises(ConnectionError) as context:
+            retry_with_backoff(fn, lambda result, error: isinstance(error, ConnectionError), max_attempts=2)
+        self.assertEqual(str(context.exception), "2")
+    
+    @patch('src.utils.retry.time.sleep')
+    def test_delay_is_capped(self, mock_sleep):
+        """Test que le délai (jitter compris) ne dépasse pas max_delay augmenté de 50 %"""
+        fn = MagicMock(return_value=None)
+        
+        retry_with_backoff(fn, lambda result, error: True, max_attempts=5, base_delay=1.0, max_delay=2.0)
+        
+        delays = [call[0][0] for call in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 4)
+        self.assertTrue(all(1.0 <= delay <= 3.0 for delay in delays))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+from datetime import timedelta
+
+# Ajouter le répertoire parent au chemin de recherche
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models.user_state import UserStateStore
+
+class TestUserStateStore(unittest.TestCase):
+    
+    def _shared_store(self):
+        """Crée un magasin d'états partagé via MongoDB"""
+        with patch.dict(os.environ, {"MONGODB_URI": "mongodb://test"}):
+            return UserStateStore()
+    
+    def test_local_store_without_mongodb(self):
+        """Test le stockage local sans MongoDB"""
+        with patch.dict(os.environ, {}, clear=True):
+            store = UserStateStore()
+        
+        self.assertFalse(store.shared)
+        self.assertIsNone(store.get("123"))
+        self.assertEqual(store.get("123", "mistral"), "mistral")
+        self.assertNotIn("123", store)
+        
+        store["123"] = "youtube"
+        self.assertEqual(store.get("123"), "youtube")
+        self.assertEqual(store["123"], "youtube")
+        self.assertIn("123", store)
+    
+    @patch('src.models.user_state.get_database')
+    def test_shared_store_reads_through_to_mongodb(self, mock_get_database):
+        """Test la lecture dans MongoDB derrière le cache de lecture de courte durée"""
+        db = MagicMock()
+        db.user_states.find_one.side_effect = [None, {"state": "youtube"}, {"state": "mistral"}]
+        mock_get_database.return_value = db
+        store = self._shared_store()
+        
+        # L'absence d'état n'est pas mise en cache
+        self.assertIsNone(store.get("123"))
+        self.assertEqual(store.get("123"), "youtube")
+        
+        # Un état lu récemment est servi sans nouvelle requête
+        self.assertEqual(store.get("123"), "youtube")
+        self.assertEqual(db.user_states.find_one.call_count, 2)
+        
+        # Une fois le cache de lecture expiré, l'état modifié par un autre worker est relu
+        store._recent.clear()
+        self.assertEqual(store.get("123"), "mistral")
+        self.assertEqual(db.user_states.find_one.call_count, 3)
+    
+    @patch('src.models.user_state.get_database')
+    def test_shared_store_writes_to_mongodb(self, mock_get_database):
+        """Test l'enregistrement d'un état dans MongoDB"""
+        db = MagicMock()
+        mock_get_database.return_value = db
+        store = self._shared_store()
+        
+        store["123"] = "imdb_search"
+        
+        db.user_states.update_one.assert_called_once()
+        args, kwargs = db.user_states.update_one.call_args
+        self.assertEqual(args[0], {"_id": "123"})
+        self.assertEqual(args[1]["$set"]["state"], "imdb_search")
+        # La date alimente l'index TTL : elle doit être en UTC
+        self.assertEqual(args[1]["$set"]["updated_at"].utcoffset(), timedelta(0))
+        self.assertTrue(kwargs["upsert"])
+    
+    @patch('src.models.user_state.get_database')
+    def test_shared_store_falls_back_when_mongodb_is_down(self, mock_get_database):
+        """Test le repli sur la dernière valeur connue quand MongoDB est injoignable"""
+        db = MagicMock()
+        db.user_states.find_one.return_value = {"state": "youtube"}
+        mock_get_database.return_value = db
+        store = self._shared_store()
+        self.assertEqual(store.get("123"), "youtube")
+        
+        store._recent.clear()
+        mock_get_database.side_effect = Exception("MongoDB injoignable")
+        self.assertEqual(store.get("123"), "youtube")
+        self.assertIsNone(store.get("456"))
+        
+        # get_database renvoie None tant que la reconnexion est différée
+        mock_get_database.side_effect = None
+        mock_get_database.return_value = None
+        self.assertEqual(store.get("123"), "youtube")
+
+if __name__ == '__main__':
+    unittest.main()